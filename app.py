@@ -1,12 +1,21 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from datetime import datetime, timedelta
-import gspread
-from google.oauth2.service_account import Credentials
+from datetime import datetime
+import os
+import logging
+from engine import (
+    SHEETS_MAX_WORKERS, STATUS_ORDER, DEFAULT_WEEKCOVER_THRESHOLDS, PRIORITY_DISPLAY_COLUMNS,
+    ANALYSIS_CACHE_SIZE, EXPORT_FORMATS,
+    AnalysisCache, SnapshotRefresher, SnapshotStore, SourceFrameCache, authorize_gspread,
+    load_daily_sales_cube, run_stock_health, recalculate_weekcover_status, weekcover_thresholds,
+    summarize_inventory_control, build_inventory_control_table, store_display_names,
+    inventory_control_report, simulate_weekcover_scenarios, summarize_scenarios,
+    build_priority_actions, serialize_frame, export_file_name,
+    PerfRecorder, perf_stage, perf_logger,
+)
 
 # --- KONFIGURASI HALAMAN PROFESIONAL ---
 st.set_page_config(
@@ -109,378 +118,228 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- KONEKSI KE GOOGLE SHEETS (DI CACHE) ---
-@st.cache_data(ttl=300, show_spinner="🔄 Loading real-time data from Google Sheets...")
-def load_data():
-    scope = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
-    credentials = Credentials.from_service_account_info(
-        st.secrets["gcp_service_account"], scopes=scope
+@st.cache_resource
+def get_gspread_client():
+    return authorize_gspread(st.secrets["gcp_service_account"])
+
+@st.cache_resource
+def get_source_frame_cache():
+    return SourceFrameCache()
+
+@st.cache_resource
+def get_snapshot_refresher():
+    """Satu refresher per proses; snapshot diperbarui thread background (stale-while-revalidate)"""
+    return SnapshotRefresher(
+        get_gspread_client(), max_workers=SHEETS_MAX_WORKERS,
+        snapshot_store=SnapshotStore(), frame_cache=get_source_frame_cache(),
+        warm_up=warm_analysis_cache
     )
-    gc = gspread.authorize(credentials)
-    
-    # Load Kamus Store (Sheet 1) dan SKU Kamus (Sheet 2)
-    try:
-        sh_kamus = gc.open("Offline Store Kamus")
-        
-        # Sheet 1: Store Kamus dengan kolom Store (kolom C)
-        ws_store_kamus = sh_kamus.get_worksheet(0)
-        df_store_kamus = pd.DataFrame(ws_store_kamus.get_all_records())
-        
-        # Validasi kolom Store di Sheet 1
-        if 'Store' in df_store_kamus.columns:
-            st.sidebar.success("✅ Kolom 'Store' ditemukan di Sheet 1")
-        else:
-            # Coba cari kolom dengan nama yang mirip
-            store_cols = [col for col in df_store_kamus.columns if 'store' in col.lower() or 'nama' in col.lower()]
-            if store_cols:
-                df_store_kamus = df_store_kamus.rename(columns={store_cols[0]: 'Store'})
-                st.sidebar.success(f"✅ Menggunakan kolom '{store_cols[0]}' sebagai Store")
-            elif 'POS' in df_store_kamus.columns:
-                df_store_kamus['Store'] = df_store_kamus['POS']
-                st.sidebar.warning("⚠️ Menggunakan POS sebagai Store name")
-        
-        # Sheet 2: SKU Kamus (SKU dan Kategori)
-        ws_sku_kamus = sh_kamus.get_worksheet(1)
-        df_sku_kamus = pd.DataFrame(ws_sku_kamus.get_all_records())
-        
-        # Validasi kolom SKU dan SKU_Category
-        if 'SKU' not in df_sku_kamus.columns:
-            sku_cols = [col for col in df_sku_kamus.columns if 'sku' in col.lower()]
-            if sku_cols:
-                df_sku_kamus = df_sku_kamus.rename(columns={sku_cols[0]: 'SKU'})
-            else:
-                st.error("❌ Kolom 'SKU' tidak ditemukan di Sheet 2")
-                return None, None, None, None
-        
-        if 'SKU_Category' not in df_sku_kamus.columns:
-            category_cols = [col for col in df_sku_kamus.columns if 'category' in col.lower() or 'kategori' in col.lower()]
-            if category_cols:
-                df_sku_kamus = df_sku_kamus.rename(columns={category_cols[0]: 'SKU_Category'})
-            else:
-                st.error("❌ Kolom 'SKU_Category' tidak ditemukan di Sheet 2")
-                return None, None, None, None
-                
-    except Exception as e:
-        st.error(f"⚠️ Error loading kamus data: {e}")
-        return None, None, None, None
-    
-    # List semua spreadsheet
-    all_files = gc.list_spreadsheet_files()
-    
-    # Cari file berdasarkan pattern
-    file_ids = {
-        'export': None,
-        'amb': None,
-        'bsb': None,
-        'mcd': None
-    }
-    
-    for f in all_files:
-        name = f['name'].lower()
-        if 'export_' in name and 'xlsx' not in name:
-            file_ids['export'] = f['id']
-        elif 'source_amb' in name:
-            file_ids['amb'] = f['id']
-        elif 'source_bsb' in name:
-            file_ids['bsb'] = f['id']
-        elif 'source_mcd' in name:
-            file_ids['mcd'] = f['id']
-    
-    # Load Sales Data
-    if file_ids['export']:
-        ws_sales = gc.open_by_key(file_ids['export']).get_worksheet(0)
-        df_sales = pd.DataFrame(ws_sales.get_all_records())
-        cols_sales = ['Ordernumber', 'Orderdate', 'ItemSKU', 'ItemPrice', 'ItemOrdered']
-        
-        # Validasi kolom sales
-        available_cols = [col for col in cols_sales if col in df_sales.columns]
-        if len(available_cols) < 3:
-            st.error("❌ Kolom sales tidak lengkap")
-            df_sales = pd.DataFrame()
-        else:
-            df_sales = df_sales[available_cols]
-    else:
-        st.error("❌ File sales (export_) tidak ditemukan!")
-        df_sales = pd.DataFrame()
-    
-    # Load Stock Data
-    stock_dfs = []
-    store_mapping = {'amb': 'AMB', 'bsb': 'BSB', 'mcd': 'MCD'}
-    
-    for key, store_code in store_mapping.items():
-        if file_ids[key]:
-            try:
-                ws = gc.open_by_key(file_ids[key]).get_worksheet(0)
-                df = pd.DataFrame(ws.get_all_records())
-                if len(df) > 0:
-                    # Standardize column names
-                    col_mapping = {}
-                    for col in df.columns:
-                        col_lower = col.lower()
-                        if 'location' in col_lower or 'store' in col_lower or 'pos' in col_lower:
-                            col_mapping[col] = 'Location Code'
-                        elif 'sku' in col_lower:
-                            col_mapping[col] = 'SKU'
-                        elif 'total' in col_lower or 'stock' in col_lower or 'qty' in col_lower:
-                            col_mapping[col] = 'Total'
-                    
-                    df = df.rename(columns=col_mapping)
-                    
-                    # Pastikan kolom yang dibutuhkan ada
-                    if 'SKU' not in df.columns or 'Total' not in df.columns:
-                        st.warning(f"⚠️ Kolom SKU atau Total tidak ditemukan di file {store_code}")
-                        continue
-                    
-                    # Jika tidak ada Location Code, tambahkan dari store_code
-                    if 'Location Code' not in df.columns:
-                        df['Location Code'] = store_code
-                    
-                    df['Store_Code'] = store_code
-                    stock_dfs.append(df[['Location Code', 'SKU', 'Total', 'Store_Code']])
-                    
-            except Exception as e:
-                st.warning(f"⚠️ Gagal load stock data untuk {store_code}: {e}")
-    
-    df_stock_total = pd.concat(stock_dfs, ignore_index=True) if stock_dfs else pd.DataFrame()
-    
-    return df_sales, df_store_kamus, df_sku_kamus, df_stock_total
 
-# --- FUNGSI UNTUK INVENTORY CONTROL TABLE DENGAN 8 WEEKS THRESHOLD ---
-def create_inventory_control_table(analysis_df, sales_data, store_name, store_display_name=None):
-    """Membuat tabel Inventory Control dengan threshold 8 minggu"""
-    
-    if store_display_name is None:
-        store_display_name = store_name
-    
-    # Filter data untuk store tertentu
-    store_data = analysis_df[analysis_df['Store_Name'] == store_name].copy()
-    
-    if store_data.empty:
-        return None
-    
-    # Hitung Week Cover dengan benar (Month Cover * 4.33)
-    store_data['Week_Cover'] = store_data['Month_Cover'] * 4.33
-    
-    # Klasifikasi berdasarkan WEEK COVER (8 minggu = healthy threshold)
-    def classify_by_weekcover(row):
-        if row['Total'] > 0 and row['AMS'] == 0:
-            return "📦 New/Dead Stock"
-        elif row['Week_Cover'] < 2:      # < 2 minggu
-            return "🚨 Critical"
-        elif row['Week_Cover'] < 4:      # < 4 minggu
-            return "⚠️ Need Reorder"
-        elif row['Week_Cover'] <= 8:     # ≤ 8 minggu (HEALTHY THRESHOLD)
-            return "✅ Healthy"
-        elif row['Week_Cover'] <= 12:    # ≤ 12 minggu
-            return "📈 Good Buffer"
-        else:                            # > 12 minggu
-            return "🛑 Overstock"
-    
-    store_data['Week_Status'] = store_data.apply(classify_by_weekcover, axis=1)
-    
-    # Hitung metrics berdasarkan WEEK status
-    week_status_counts = store_data['Week_Status'].value_counts()
-    
-    # Mapping status ke kategori control berdasarkan WEEK COVER
-    ideal_count = week_status_counts.get('✅ Healthy', 0) + week_status_counts.get('📈 Good Buffer', 0)
-    need_replenishment = week_status_counts.get('🚨 Critical', 0) + week_status_counts.get('⚠️ Need Reorder', 0)
-    over_stock = week_status_counts.get('🛑 Overstock', 0)
-    non_moving = week_status_counts.get('📦 New/Dead Stock', 0)
-    
-    # Hitung total metrics
-    count_of_sku = len(store_data)
-    qty_stock = store_data['Total'].sum()
-    avg_sales = store_data['AMS'].sum()
-    
-    # Hitung Average Week Cover (median)
-    avg_weekcover = store_data['Week_Cover'].median()
-    
-    # Hitung Replenishment Quantity Suggested untuk mencapai 8 minggu cover
-    reorder_data = store_data[store_data['Week_Status'].isin(['🚨 Critical', '⚠️ Need Reorder'])]
-    if not reorder_data.empty:
-        # Target 8 minggu cover (2 bulan inventory)
-        reorder_data['Replenishment_Suggest'] = np.where(
-            reorder_data['Week_Cover'] < 8,
-            (reorder_data['AMS'] * 2 - reorder_data['Total']).clip(lower=0),  # Target 2 bulan
-            (reorder_data['AMS'] * 0.5).clip(lower=0)
-        )
-        replenishment_qty_suggest = reorder_data['Replenishment_Suggest'].sum()
-    else:
-        replenishment_qty_suggest = 0
-    
-    # Buat dictionary untuk tabel
-    control_data = {
-        'Metric': ['Ideal Stock', 'Need Replenishment', 'Over Stock', 'Non Moving Stock', 
-                   'Count of SKU', 'Qty Stock', 'AVG Sales', 'Replenishment Qty Suggest', 'Weekcover'],
-        'Value': [
-            int(ideal_count),
-            int(need_replenishment),
-            int(over_stock),
-            int(non_moving),
-            int(count_of_sku),
-            f"{int(qty_stock):,}",
-            f"{int(avg_sales):,}",
-            f"{int(replenishment_qty_suggest):,}",
-            f"{avg_weekcover:.1f}"
-        ]
-    }
-    
-    # Buat DataFrame untuk Control section
-    control_df = pd.DataFrame(control_data)
-    
-    # Buat Grand Total section
-    grand_total_data = {
-        'Metric': ['Count of SKU', 'Qty Stock', 'AVG Sales', 'Replenishment Qty Suggest', 'Weekcover'],
-        'Value': [
-            f"**{int(count_of_sku)}**",
-            f"**{int(qty_stock):,}**",
-            f"**{int(avg_sales):,}**",
-            f"**{int(replenishment_qty_suggest):,}**",
-            f"**{avg_weekcover:.1f}**"
-        ]
-    }
-    
-    grand_total_df = pd.DataFrame(grand_total_data)
-    
-    return {
-        'store_name': store_display_name,
-        'control_df': control_df,
-        'grand_total_df': grand_total_df,
-        'raw_metrics': {
-            'ideal_stock': int(ideal_count),
-            'need_replenishment': int(need_replenishment),
-            'over_stock': int(over_stock),
-            'non_moving': int(non_moving),
-            'count_of_sku': int(count_of_sku),
-            'qty_stock': int(qty_stock),
-            'avg_sales': int(avg_sales),
-            'replenishment_qty_suggest': int(replenishment_qty_suggest),
-            'weekcover': avg_weekcover
-        },
-        'week_status_data': store_data
+def notify_streamlit(level, message):
+    """Tampilkan pesan loading dari engine: status sumber di sidebar, masalah data di halaman utama"""
+    renderers = {
+        'caption': st.sidebar.caption,
+        'success': st.sidebar.success,
+        'notice': st.sidebar.warning,
+        'warning': st.warning,
+        'error': st.error,
     }
+    renderers[level](message)
 
-# --- FUNGSI HELPER UNTUK ANALISIS DENGAN FILTER SKU ---
-def filter_by_sku_kamus(df, sku_kamus):
-    """Filter dataframe hanya untuk SKU yang ada di SKU Kamus"""
-    if sku_kamus.empty:
-        return df
-    
-    valid_skus = sku_kamus['SKU'].astype(str).str.strip().unique()
-    
-    if 'ItemSKU' in df.columns:
-        # Untuk sales data
-        df_filtered = df[df['ItemSKU'].astype(str).str.strip().isin(valid_skus)].copy()
-        # Tambahkan kategori SKU
-        sku_mapping = sku_kamus.set_index('SKU')['SKU_Category'].to_dict()
-        df_filtered['SKU_Category'] = df_filtered['ItemSKU'].astype(str).str.strip().map(sku_mapping)
-    
-    elif 'SKU' in df.columns:
-        # Untuk stock data
-        df_filtered = df[df['SKU'].astype(str).str.strip().isin(valid_skus)].copy()
-        # Tambahkan kategori SKU
-        sku_mapping = sku_kamus.set_index('SKU')['SKU_Category'].to_dict()
-        df_filtered['SKU_Category'] = df_filtered['SKU'].astype(str).str.strip().map(sku_mapping)
-    
-    else:
-        return df
+def load_data():
+    """DataSnapshot terkini, dipakai bersama semua session (None jika source belum bisa di-load).
     
-    return df_filtered
+    Hanya load pertama setelah server start yang menunggu Google Sheets. Setelah itu
+    perubahan source di-load oleh thread background dan rerun memakai snapshot yang ada.
+    """
+    return get_snapshot_refresher().get()
 
-def calculate_stock_health(df_stock, df_sales_mapped, sku_kamus, store_name=None):
-    """Hitung health metrics untuk stock (hanya SKU yang ada di kamus)"""
-    
-    # Filter hanya SKU yang ada di kamus
-    df_stock_filtered = filter_by_sku_kamus(df_stock, sku_kamus)
-    df_sales_filtered = filter_by_sku_kamus(df_sales_mapped, sku_kamus)
-    
-    if store_name:
-        stock_data = df_stock_filtered[df_stock_filtered['Store_Name'] == store_name].copy()
-        sales_data = df_sales_filtered[df_sales_filtered['Store_Name'] == store_name].copy()
-    else:
-        stock_data = df_stock_filtered.copy()
-        sales_data = df_sales_filtered.copy()
-    
-    if stock_data.empty:
-        return pd.DataFrame()
-    
-    # Hitung sales 3 bulan terakhir per SKU
-    current_date = datetime.now()
-    start_date_3mo = current_date - timedelta(days=90)
-    
-    sales_data['Orderdate'] = pd.to_datetime(sales_data['Orderdate'], errors='coerce')
-    recent_sales = sales_data[sales_data['Orderdate'] >= start_date_3mo]
-    
-    if not recent_sales.empty:
-        sku_sales = recent_sales.groupby('ItemSKU').agg({
-            'ItemOrdered': 'sum',
-            'ItemPrice': 'mean'
-        }).reset_index()
-        sku_sales.columns = ['SKU', 'Qty_3Mo', 'Avg_Price']
-        sku_sales['AMS'] = sku_sales['Qty_3Mo'] / 3
-    else:
-        # Buat dataframe kosong jika tidak ada sales
-        sku_sales = pd.DataFrame(columns=['SKU', 'Qty_3Mo', 'Avg_Price', 'AMS'])
-    
-    # Gabungkan dengan stock
-    analysis_df = stock_data.groupby(['SKU', 'Store_Name', 'SKU_Category']).agg({'Total': 'sum'}).reset_index()
-    
-    if not sku_sales.empty:
-        analysis_df = pd.merge(analysis_df, sku_sales, on='SKU', how='left')
-    else:
-        analysis_df['Qty_3Mo'] = 0
-        analysis_df['Avg_Price'] = analysis_df['Total'].median()
-        analysis_df['AMS'] = 0
-    
-    # Fill NaN values
-    analysis_df['Qty_3Mo'] = analysis_df['Qty_3Mo'].fillna(0)
-    analysis_df['AMS'] = analysis_df['AMS'].fillna(0)
-    analysis_df['Avg_Price'] = analysis_df['Avg_Price'].fillna(analysis_df['Avg_Price'].median() if not analysis_df['Avg_Price'].isna().all() else 0)
-    
-    # Hitung Month Cover
-    analysis_df['Month_Cover'] = np.where(
-        analysis_df['AMS'] > 0,
-        analysis_df['Total'] / analysis_df['AMS'],
-        999
+def format_drive_time(modified_time):
+    """modifiedTime Drive (ISO, UTC) -> waktu lokal dd/mm HH:MM"""
+    if not modified_time:
+        return "-"
+    try:
+        return datetime.fromisoformat(modified_time.replace('Z', '+00:00')).astimezone().strftime('%d/%m %H:%M')
+    except ValueError:
+        return str(modified_time)
+
+def render_data_freshness(refresher, snapshot):
+    """Data as of per source (modifiedTime di Drive) + waktu load dan pengecekan terakhir"""
+    data_as_of = snapshot.data_as_of()
+    st.sidebar.caption("🕒 Data as of: " + " · ".join(
+        f"{source} {format_drive_time(data_as_of[source])}" for source in sorted(data_as_of)
+    ))
+    checked_at = refresher.checked_at.strftime('%H:%M:%S') if refresher.checked_at else "-"
+    st.sidebar.caption(f"🔄 Snapshot loaded {snapshot.loaded_at.strftime('%d/%m %H:%M:%S')} · last check {checked_at}")
+    if refresher.last_error:
+        st.sidebar.warning(f"⚠️ Refresh terakhir gagal, data sebelumnya tetap dipakai: {refresher.last_error}")
+
+# --- MEMOISASI ANALISIS (DIPAKAI BERSAMA SEMUA SESSION) ---
+@st.cache_resource
+def get_analysis_cache():
+    return AnalysisCache(ANALYSIS_CACHE_SIZE)
+
+def get_daily_sales_cube(snapshot, stage=None):
+    """DailySalesCube per versi data; dibaca dari snapshot disk jika export & kamus tidak berubah"""
+    source_files, _ = snapshot.data_version
+    return get_analysis_cache().get_or_compute(
+        ('daily_sales_cube', snapshot.data_version),
+        lambda: load_daily_sales_cube(snapshot.sales_mapped, source_files),
+        stage
     )
-    
-    # Hitung Week Cover (Month Cover * 4.33)
-    analysis_df['Week_Cover'] = analysis_df['Month_Cover'] * 4.33
-    
-    # Hitung nilai stock
-    analysis_df['Stock_Value'] = analysis_df['Total'] * analysis_df['Avg_Price']
-    
-    # Klasifikasi Status berdasarkan WEEK COVER (8 minggu threshold)
-    def classify_status(row):
-        if row['Total'] > 0 and row['AMS'] == 0:
-            return "📦 New/Dead Stock"
-        elif row['Week_Cover'] < 2:
-            return "🚨 Critical"
-        elif row['Week_Cover'] < 4:
-            return "⚠️ Need Reorder"
-        elif row['Week_Cover'] <= 8:  # HEALTHY THRESHOLD = 8 MINGGU
-            return "✅ Healthy"
-        elif row['Week_Cover'] <= 12:
-            return "📈 Good Buffer"
-        else:
-            return "🛑 Overstock"
-    
-    analysis_df['Status'] = analysis_df.apply(classify_status, axis=1)
-    
-    # Urutan status untuk sorting
-    status_order = {
-        "🚨 Critical": 1,
-        "⚠️ Need Reorder": 2,
-        "✅ Healthy": 3,
-        "📈 Good Buffer": 4,
-        "🛑 Overstock": 5,
-        "📦 New/Dead Stock": 6
+
+def get_full_analysis(snapshot, stage=None):
+    """Analisis stock health untuk semua store & kategori, dihitung sekali per versi data.
+    
+    Karena AMS dihitung per (store, SKU), filter store dan kategori cukup berupa boolean
+    mask di atas hasil ini. Tanggal hari ini ikut jadi key karena window AMS 90 hari bergeser.
+    """
+    def compute():
+        daily_cube = get_daily_sales_cube(snapshot)
+        return run_stock_health(snapshot.stock, snapshot.sales_mapped, snapshot.sku_index, daily_cube)
+    
+    key = ('full_analysis', snapshot.data_version, datetime.now().date())
+    return get_analysis_cache().get_or_compute(key, compute, stage)
+
+def warm_analysis_cache(snapshot):
+    """Dipanggil refresher (thread background) sebelum snapshot baru dipasang: daily cube dan
+    analisis default sudah ada di cache, jadi rerun pertama setelah refresh tidak menunggu"""
+    get_full_analysis(snapshot)
+
+def get_whatif_analysis(snapshot, thresholds, stage=None):
+    """Analisis lengkap untuk threshold tertentu, diturunkan dari analisis default yang di-cache"""
+    full_analysis_df = get_full_analysis(snapshot, stage)
+    if tuple(thresholds) == DEFAULT_WEEKCOVER_THRESHOLDS:
+        return full_analysis_df
+    
+    key = ('whatif_analysis', snapshot.data_version, datetime.now().date(), tuple(thresholds))
+    return get_analysis_cache().get_or_compute(
+        key, lambda: recalculate_weekcover_status(full_analysis_df, thresholds), stage
+    )
+
+def get_weekcover_scenarios(data_version, scope, analysis_df, targets, critical, reorder, buffer_margin):
+    """Memo simulate_weekcover_scenarios; scope = filter store/kategori yang membentuk analysis_df"""
+    key = ('scenarios', data_version, datetime.now().date(), scope,
+           tuple(sorted(targets)), critical, reorder, buffer_margin)
+    return get_analysis_cache().get_or_compute(
+        key, lambda: simulate_weekcover_scenarios(analysis_df, targets, critical, reorder, buffer_margin)
+    )
+
+# --- EXPORT (SERIALISASI ON-DEMAND, DI CACHE) ---
+EXPORT_CACHE_SIZE = 8
+@st.cache_resource
+def get_export_cache():
+    return AnalysisCache(EXPORT_CACHE_SIZE)
+
+def lazy_export(key, build_frame, export_format):
+    """Callable untuk st.download_button: frame dibangun dan diserialisasi saat tombol diklik.
+    
+    Bytes di-cache per (key, format), key harus mencakup versi data dan filter yang
+    membentuk frame. build_frame tidak boleh memanggil perintah Streamlit.
+    """
+    export_cache = get_export_cache()
+    return lambda: export_cache.get_or_compute(
+        key + (export_format,), lambda: serialize_frame(build_frame(), export_format)
+    )
+
+# --- INSTRUMENTASI (PANEL ADMIN & JSON LOG) ---
+ADMIN_QUERY_PARAM = "admin"  # Panel performa tampil di sidebar dengan ?admin=1
+PERF_LOG_ENV = "DASHBOARD_PERF_LOG"  # "1" = JSON log ke stderr, selain itu path file (JSON lines)
+
+@st.cache_resource
+def configure_perf_log(target):
+    """Pasang handler JSON log sekali per proses"""
+    handler = logging.StreamHandler() if target in ("1", "stderr") else logging.FileHandler(target)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    perf_logger.addHandler(handler)
+    perf_logger.setLevel(logging.INFO)
+    perf_logger.propagate = False
+    return handler
+
+def collect_cache_stats():
+    """Hit/miss semua cache: snapshot (cek versi vs rebuild), memo analisis dan export"""
+    return {
+        **{f"refresher:{name}": counts for name, counts in get_snapshot_refresher().counters.stats().items()},
+        **{f"analysis:{name}": counts for name, counts in get_analysis_cache().counters.stats().items()},
+        **{f"export:{name}": counts for name, counts in get_export_cache().counters.stats().items()},
     }
-    analysis_df['Status_Order'] = analysis_df['Status'].map(status_order)
-    
-    return analysis_df.sort_values('Status_Order')
+
+PERF_STAGE_COLUMNS = {
+    "seconds": st.column_config.NumberColumn("Seconds", format="%.3f"),
+    "rows": st.column_config.NumberColumn("Rows", format="%d"),
+    "memory_mb": st.column_config.NumberColumn("Memory MB", format="%.1f"),
+    "cached": st.column_config.CheckboxColumn("Cache hit"),
+}
+
+def render_perf_panel(recorder, cache_stats, refresh_recorder=None, sheets_stats=None):
+    with st.sidebar.expander("🛠️ Performance (admin)"):
+        st.caption(f"Rerun: {recorder.total_seconds():.2f}s sampai panel ini dirender")
+        st.dataframe(
+            pd.DataFrame(recorder.stages),
+            column_config=PERF_STAGE_COLUMNS,
+            use_container_width=True,
+            hide_index=True
+        )
+        if refresh_recorder is not None:
+            st.caption(f"Load snapshot terakhir (background): {refresh_recorder.total_seconds():.2f}s")
+            st.dataframe(
+                pd.DataFrame(refresh_recorder.stages),
+                column_config=PERF_STAGE_COLUMNS,
+                use_container_width=True,
+                hide_index=True
+            )
+        st.dataframe(
+            pd.DataFrame.from_dict(cache_stats, orient='index').rename_axis('Cache').reset_index(),
+            use_container_width=True,
+            hide_index=True
+        )
+        if sheets_stats:
+            # Request, retry, HTTP 429 dan latency per file sejak server start
+            st.caption("Google Sheets reads (kumulatif)")
+            st.dataframe(
+                pd.DataFrame.from_dict(sheets_stats, orient='index').rename_axis('Source').reset_index().round(3),
+                use_container_width=True,
+                hide_index=True
+            )
+
+# --- PAGINATION (PAYLOAD TETAP KECIL UNTUK BANYAK STORE / SKU) ---
+PAGE_SIZE_OPTIONS = [10, 25, 50, 100]
+
+def render_page_controls(n_items, key, label="items", default_page_size=10):
+    """Kontrol rows per page + nomor halaman; return (start, stop) untuk halaman aktif.
+    
+    Tidak menampilkan kontrol apa pun bila semua item muat di satu halaman terkecil.
+    """
+    if n_items <= PAGE_SIZE_OPTIONS[0]:
+        return 0, n_items
+    
+    page_key = f"{key}_page"
+    col_size, col_page, col_info = st.columns([1, 1, 2])
+    with col_size:
+        page_size = st.selectbox(
+            "Rows per page:", PAGE_SIZE_OPTIONS,
+            index=PAGE_SIZE_OPTIONS.index(default_page_size), key=f"{key}_page_size"
+        )
+    n_pages = -(-n_items // page_size)
+    # Page lama bisa melewati jumlah halaman setelah page size / filter berubah
+    if st.session_state.get(page_key, 1) > n_pages:
+        st.session_state[page_key] = n_pages
+    with col_page:
+        page = st.number_input("Page:", min_value=1, max_value=n_pages, value=1, step=1, key=page_key)
+    
+    start = (page - 1) * page_size
+    stop = min(start + page_size, n_items)
+    with col_info:
+        st.caption(f"Showing {start + 1}-{stop} of {n_items} {label} (page {page}/{n_pages})")
+    return start, stop
 
 # --- MAIN DASHBOARD ---
 try:
+    # Instrumentasi hanya aktif untuk admin panel / JSON log (tanpa overhead di luar itu)
+    perf_log_target = os.environ.get(PERF_LOG_ENV)
+    show_perf_panel = st.query_params.get(ADMIN_QUERY_PARAM) == "1"
+    perf = PerfRecorder() if (show_perf_panel or perf_log_target) else None
+    
     # Header dengan gradient premium
     st.markdown("""
     <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
@@ -490,64 +349,44 @@ try:
                 color: white;">
         <h1 style="color: white; margin: 0; font-size: 2.8rem;">🏭 Flagship Store Inventory Control</h1>
         <p style="opacity: 0.9; font-size: 1.1rem; margin-top: 0.5rem;">Dashboard Monitoring & Replenishment System</p>
-        <p style="opacity: 0.8; font-size: 0.9rem; margin-top: 0.2rem;">As of: """ + datetime.now().strftime("%d/%m/%Y") + """ | Health Threshold: ≥8 Weeks Cover</p>
+        <p style="opacity: 0.8; font-size: 0.9rem; margin-top: 0.2rem;">As of: """ + datetime.now().strftime("%d/%m/%Y") + """ | Health Threshold: ≥""" + str(st.session_state.get('target_weekcover', 8)) + """ Weeks Cover</p>
     </div>
     """, unsafe_allow_html=True)
     
     # Load data dengan spinner yang elegan
     with st.spinner("🔄 Loading real-time data from Google Sheets..."):
-        df_sales, df_store_kamus, df_sku_kamus, df_stock = load_data()
-    
-    if df_sales is None or df_stock is None or df_sku_kamus is None:
+        with perf_stage(perf, "load_data (shared snapshot)") as stage:
+            snapshot = load_data()
+            if snapshot is not None:
+                stage['frame'] = [snapshot.sales_mapped, snapshot.store_kamus, snapshot.sku_kamus, snapshot.stock]
+    
+    refresher = get_snapshot_refresher()
+    if snapshot is None:
+        for level, message in refresher.last_messages:
+            notify_streamlit(level, message)
         st.error("❌ Data tidak dapat dimuat. Pastikan file sumber dan struktur data sudah benar.")
+        if refresher.last_error:
+            st.caption(refresher.last_error)
         st.stop()
     
-    # --- DATA PREPARATION DENGAN FILTER SKU ---
-    df_sales['Orderdate'] = pd.to_datetime(df_sales['Orderdate'], dayfirst=True, errors='coerce')
-    df_sales = df_sales.dropna(subset=['Orderdate'])
+    # Pesan loading snapshot ditampilkan ulang di setiap rerun (load-nya sendiri sudah di-cache)
+    for level, message in snapshot.messages:
+        notify_streamlit(level, message)
+    render_data_freshness(refresher, snapshot)
     
-    # Mapping store code dengan nama store dari kolom Store di Sheet 1
-    df_sales['POS_Code'] = df_sales['Ordernumber'].astype(str).str[:4]
-    
-    # Buat mapping dari POS ke Store Name dari df_store_kamus
-    if 'Store' in df_store_kamus.columns and 'POS' in df_store_kamus.columns:
-        pos_to_store_mapping = df_store_kamus.set_index('POS')['Store'].to_dict()
-        
-        # Apply mapping ke sales data
-        df_sales_mapped = df_sales.copy()
-        df_sales_mapped['Store_Name'] = df_sales_mapped['POS_Code'].map(pos_to_store_mapping)
-        
-        # Apply mapping ke stock data
-        if 'Location Code' in df_stock.columns:
-            df_stock['Store_Name'] = df_stock['Location Code'].map(pos_to_store_mapping)
-            
-            # Jika tidak ada mapping, gunakan Store_Code dengan mapping custom
-            store_code_mapping = {'AMB': 'AEON Mall BSD', 'BSB': 'Botani Square Bogor', 'MCD': 'Margo City Depok'}
-            missing_mask = df_stock['Store_Name'].isna()
-            df_stock.loc[missing_mask, 'Store_Name'] = df_stock.loc[missing_mask, 'Store_Code'].map(store_code_mapping)
-            
-    else:
-        # Fallback: gunakan kolom yang ada
-        df_sales_mapped = pd.merge(df_sales, df_store_kamus, left_on='POS_Code', right_on='POS', how='left')
-        df_stock['Store_Name'] = df_stock['Store_Code']
+    # --- DATA DARI SNAPSHOT BERSAMA ---
+    # Mapping store & SKU index sudah dihitung saat snapshot dibangun; frame di sini hanya
+    # shallow copy (tanpa salinan data) dari snapshot yang dipakai semua session
+    data_version = snapshot.data_version
+    df_store_kamus, df_sku_kamus, df_stock = snapshot.store_kamus, snapshot.sku_kamus, snapshot.stock
     
     # --- SIDEBAR FILTER PROFESIONAL ---
     with st.sidebar:
         st.markdown("### ⚙️ Dashboard Configuration")
         
-        # Info Threshold
+        # Info Threshold (diisi setelah target weekcover dipilih)
         st.markdown("**📊 Health Threshold Configuration**")
-        st.markdown("""
-        <div class="threshold-info">
-        <strong>Stock Classification:</strong><br>
-        • 🚨 Critical: < 2 weeks<br>
-        • ⚠️ Need Reorder: 2-4 weeks<br>
-        • ✅ Healthy: 4-8 weeks<br>
-        • 📈 Good Buffer: 8-12 weeks<br>
-        • 🛑 Overstock: > 12 weeks<br>
-        <strong>Target: ≥ 8 weeks cover</strong>
-        </div>
-        """, unsafe_allow_html=True)
+        threshold_info = st.empty()
         
         # Date Display
         st.markdown(f"**📅 Date: {datetime.now().strftime('%d/%m/%Y')}**")
@@ -582,18 +421,54 @@ try:
             max_value=16,
             value=8,
             step=1,
+            key="target_weekcover",
             help="Target minimum weekcover for healthy inventory"
         )
+        
+        with st.expander("⚙️ Advanced Thresholds"):
+            critical_weeks = st.number_input("Critical below (weeks):", min_value=0, max_value=8, value=2, step=1)
+            reorder_weeks = st.number_input("Need Reorder below (weeks):", min_value=1, max_value=12, value=4, step=1)
+            buffer_margin = st.number_input("Good Buffer above target (weeks):", min_value=0, max_value=12, value=4, step=1)
+        
+        thresholds = weekcover_thresholds(target_weekcover, critical_weeks, reorder_weeks, buffer_margin)
+        critical_weeks, reorder_weeks, target_weekcover, buffer_weeks = thresholds
+        
+        threshold_info.markdown(f"""
+        <div class="threshold-info">
+        <strong>Stock Classification:</strong><br>
+        • 🚨 Critical: < {critical_weeks} weeks<br>
+        • ⚠️ Need Reorder: {critical_weeks}-{reorder_weeks} weeks<br>
+        • ✅ Healthy: {reorder_weeks}-{target_weekcover} weeks<br>
+        • 📈 Good Buffer: {target_weekcover}-{buffer_weeks} weeks<br>
+        • 🛑 Overstock: > {buffer_weeks} weeks<br>
+        <strong>Target: ≥ {target_weekcover} weeks cover</strong>
+        </div>
+        """, unsafe_allow_html=True)
     
     # Filter SKU Kamus berdasarkan kategori yang dipilih
     df_sku_kamus_filtered = df_sku_kamus[df_sku_kamus['SKU_Category'].isin(selected_categories)] if selected_categories else df_sku_kamus
     
-    # Filter data berdasarkan pilihan store
-    stock_filtered = df_stock[df_stock['Store_Name'].isin(selected_stores)] if selected_stores else df_stock
-    sales_filtered = df_sales_mapped[df_sales_mapped['Store_Name'].isin(selected_stores)] if selected_stores else df_sales_mapped
-    
-    # Hitung metrics utama dengan filter SKU
-    analysis_df = calculate_stock_health(stock_filtered, sales_filtered, df_sku_kamus_filtered)
+    # Hitung metrics utama dengan filter SKU: analisis lengkap dihitung sekali per versi data,
+    # perubahan filter store/kategori cukup di-slice dengan boolean mask
+    # Perubahan target/threshold hanya mengklasifikasi ulang hasil yang sudah di-cache
+    with perf_stage(perf, "stock health (kamus filter + classification)") as stage:
+        full_analysis_df = get_whatif_analysis(snapshot, thresholds, stage)
+        stage['frame'] = full_analysis_df
+    with perf_stage(perf, "daily sales cube") as stage:
+        daily_cube = get_daily_sales_cube(snapshot, stage)
+        stage['frame'] = daily_cube.frame
+    with perf_stage(perf, "store/category filter") as stage:
+        if not full_analysis_df.empty:
+            analysis_mask = full_analysis_df['Store_Name'].isin(selected_stores)
+            if selected_categories:
+                analysis_mask &= full_analysis_df['SKU_Category'].isin(selected_categories)
+            analysis_df = full_analysis_df[analysis_mask]
+        else:
+            analysis_df = full_analysis_df
+        stage['frame'] = analysis_df
+    # Identitas analysis_df (data + threshold + filter), dipakai sebagai key cache export
+    analysis_scope = (data_version, datetime.now().date(), thresholds,
+                      tuple(selected_stores), tuple(selected_categories or ()))
     
     # --- KPI CARDS ---
     st.markdown("### 📈 Executive Summary")
@@ -657,7 +532,7 @@ try:
     # --- TABBED INTERFACE ---
     tab1, tab2, tab3, tab4 = st.tabs(["📋 Inventory Control", "📊 Store Overview", "🚨 Priority Actions", "📈 Trends & Analysis"])
     
-    with tab1:
+    with tab1, perf_stage(perf, "render Inventory Control"):
         st.markdown(f"### 🏪 Flagship Store Inventory Control - {datetime.now().strftime('%d/%m/%Y')}")
         
         if not analysis_df.empty:
@@ -665,28 +540,40 @@ try:
             st.markdown(f"""
             <div class="threshold-info">
             <strong>Health Threshold Applied:</strong><br>
-            • ✅ Healthy: 4-8 weeks cover<br>
-            • 📈 Good Buffer: 8-12 weeks cover<br>
-            • Target: ≥8 weeks inventory coverage
+            • ✅ Healthy: {reorder_weeks}-{target_weekcover} weeks cover<br>
+            • 📈 Good Buffer: {target_weekcover}-{buffer_weeks} weeks cover<br>
+            • Target: ≥{target_weekcover} weeks inventory coverage
             </div>
             """, unsafe_allow_html=True)
             
-            # Buat inventory control table untuk setiap store
-            inventory_tables = []
+            # Semua metrics per store dihitung dalam satu groupby
+            control_metrics = summarize_inventory_control(analysis_df, thresholds)
             
-            for store in sorted(analysis_df['Store_Name'].unique()):
-                # Ambil nama display dari mapping jika ada
-                store_display_name = store
-                if 'Store' in df_store_kamus.columns:
-                    store_row = df_store_kamus[df_store_kamus['POS'] == store]
-                    if not store_row.empty and 'Store' in store_row.columns:
-                        store_display_name = store_row.iloc[0]['Store']
-                
-                # Buat inventory control table
-                table_data = create_inventory_control_table(analysis_df, sales_filtered, store, store_display_name)
+            # Ambil nama display dari mapping jika ada
+            display_names = store_display_names(df_store_kamus)
+            
+            # Summary & export memakai raw metrics semua store; detail hanya untuk halaman aktif
+            inventory_tables = [
+                {'store_name': display_names.get(store, store), 'raw_metrics': raw_metrics}
+                for store, raw_metrics in control_metrics.to_dict('index').items()
+            ]
+            
+            page_start, page_stop = render_page_controls(len(inventory_tables), key="control_stores", label="stores")
+            for store_table in inventory_tables[page_start:page_stop]:
+                raw_metrics = store_table['raw_metrics']
+                store_expander = st.expander(
+                    f"🏪 **{store_table['store_name']}** - {raw_metrics['count_of_sku']} SKUs | "
+                    f"{raw_metrics['need_replenishment']} Need Replenishment",
+                    key=f"control_{store_table['store_name']}",
+                    on_change="rerun"
+                )
+                # Konten (tabel Control & Grand Total) hanya dibangun saat expander dibuka
+                if not store_expander.open:
+                    continue
                 
-                if table_data:
-                    inventory_tables.append(table_data)
+                with store_expander:
+                    # Buat inventory control table
+                    table_data = build_inventory_control_table(store_table['store_name'], raw_metrics)
                     
                     # Tampilkan tabel
                     st.markdown(f"""
@@ -735,8 +622,8 @@ try:
                                 <div style="font-size: 1.2rem; font-weight: 700; color: #1F2937;">{row['Value'].replace('**', '')}</div>
                             </div>
                             """, unsafe_allow_html=True)
-                    
-                    st.markdown("---")
+            
+            st.markdown("---")
             
             # Summary Across All Stores
             if len(inventory_tables) > 1:
@@ -765,17 +652,17 @@ try:
                         "Store": st.column_config.TextColumn("Store Name"),
                         "Ideal Stock": st.column_config.NumberColumn(
                             "Ideal",
-                            help="SKUs with healthy stock level (≥4 weeks cover)",
+                            help=f"SKUs with healthy stock level (≥{reorder_weeks} weeks cover)",
                             format="%d"
                         ),
                         "Need Replenishment": st.column_config.NumberColumn(
                             "Need Repl.",
-                            help="SKUs that need replenishment (<4 weeks cover)",
+                            help=f"SKUs that need replenishment (<{reorder_weeks} weeks cover)",
                             format="%d"
                         ),
                         "Over Stock": st.column_config.NumberColumn(
                             "Over Stock",
-                            help="SKUs with overstock condition (>12 weeks cover)",
+                            help=f"SKUs with overstock condition (>{buffer_weeks} weeks cover)",
                             format="%d"
                         ),
                         "Non Moving": st.column_config.NumberColumn(
@@ -812,15 +699,18 @@ try:
                     total_over = summary_df['Over Stock'].sum()
                     total_non_moving = summary_df['Non Moving'].sum()
                     
+                    ideal_label = f'Ideal Stock (≥{reorder_weeks} weeks)'
+                    replenish_label = f'Need Replenishment (<{reorder_weeks} weeks)'
+                    over_label = f'Over Stock (>{buffer_weeks} weeks)'
                     fig2 = px.pie(
                         values=[total_ideal, total_replenish, total_over, total_non_moving],
-                        names=['Ideal Stock (≥4 weeks)', 'Need Replenishment (<4 weeks)', 'Over Stock (>12 weeks)', 'Non Moving'],
+                        names=[ideal_label, replenish_label, over_label, 'Non Moving'],
                         title='Total SKU Distribution Across All Stores',
-                        color=['Ideal Stock (≥4 weeks)', 'Need Replenishment (<4 weeks)', 'Over Stock (>12 weeks)', 'Non Moving'],
+                        color=[ideal_label, replenish_label, over_label, 'Non Moving'],
                         color_discrete_map={
-                            'Ideal Stock (≥4 weeks)': '#10B981',
-                            'Need Replenishment (<4 weeks)': '#F59E0B',
-                            'Over Stock (>12 weeks)': '#EF4444',
+                            ideal_label: '#10B981',
+                            replenish_label: '#F59E0B',
+                            over_label: '#EF4444',
                             'Non Moving': '#6B7280'
                         }
                     )
@@ -832,46 +722,37 @@ try:
                 st.markdown("---")
                 st.markdown("### 📥 Export Reports")
                 
+                export_format = st.selectbox(
+                    "Export format:", options=list(EXPORT_FORMATS), index=0, key="export_format",
+                    help="Files are generated only when a download button is clicked"
+                )
+                _, export_mime, _ = EXPORT_FORMATS[export_format]
+                
                 col_dl1, col_dl2, col_dl3 = st.columns(3)
                 
                 with col_dl1:
                     # Download Inventory Control Summary
-                    summary_report = []
-                    for table in inventory_tables:
-                        summary_report.append({
-                            'Date': datetime.now().strftime('%d/%m/%Y'),
-                            'Store': table['store_name'],
-                            'Ideal_Stock': table['raw_metrics']['ideal_stock'],
-                            'Need_Replenishment': table['raw_metrics']['need_replenishment'],
-                            'Over_Stock': table['raw_metrics']['over_stock'],
-                            'Non_Moving_Stock': table['raw_metrics']['non_moving'],
-                            'Count_of_SKU': table['raw_metrics']['count_of_sku'],
-                            'Qty_Stock': table['raw_metrics']['qty_stock'],
-                            'AVG_Sales': table['raw_metrics']['avg_sales'],
-                            'Replenishment_Qty_Suggest': table['raw_metrics']['replenishment_qty_suggest'],
-                            'Weekcover': table['raw_metrics']['weekcover']
-                        })
-                    
-                    summary_df = pd.DataFrame(summary_report)
-                    csv_summary = summary_df.to_csv(index=False).encode('utf-8')
+                    def build_summary_report(control_metrics=control_metrics, display_names=display_names):
+                        return inventory_control_report(control_metrics, display_names)
                     
                     st.download_button(
                         "📋 Inventory Control",
-                        csv_summary,
-                        f"inventory_control_{datetime.now().strftime('%Y%m%d')}.csv",
-                        "text/csv",
+                        lazy_export(('inventory_control',) + analysis_scope, build_summary_report, export_format),
+                        export_file_name(f"inventory_control_{datetime.now().strftime('%Y%m%d')}", export_format),
+                        export_mime,
+                        on_click="ignore",
                         use_container_width=True,
                         help="Download Inventory Control Summary"
                     )
                 
                 with col_dl2:
                     # Download Detailed Analysis
-                    csv = analysis_df.to_csv(index=False).encode('utf-8')
                     st.download_button(
                         "📊 Detailed Analysis",
-                        csv,
-                        f"detailed_analysis_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
-                        "text/csv",
+                        lazy_export(('analysis',) + analysis_scope, lambda frame=analysis_df: frame, export_format),
+                        export_file_name(f"detailed_analysis_{datetime.now().strftime('%Y%m%d_%H%M')}", export_format),
+                        export_mime,
+                        on_click="ignore",
                         use_container_width=True,
                         help="Download detailed SKU-level analysis with week cover"
                     )
@@ -879,12 +760,15 @@ try:
                 with col_dl3:
                     # Download SKU Kamus yang digunakan
                     if not df_sku_kamus_filtered.empty:
-                        csv_kamus = df_sku_kamus_filtered.to_csv(index=False).encode('utf-8')
                         st.download_button(
                             "📝 SKU Filter",
-                            csv_kamus,
-                            f"sku_kamus_filter_{datetime.now().strftime('%Y%m%d')}.csv",
-                            "text/csv",
+                            lazy_export(
+                                ('sku_kamus', data_version, tuple(selected_categories or ())),
+                                lambda frame=df_sku_kamus_filtered: frame, export_format
+                            ),
+                            export_file_name(f"sku_kamus_filter_{datetime.now().strftime('%Y%m%d')}", export_format),
+                            export_mime,
+                            on_click="ignore",
                             use_container_width=True,
                             help="Download filtered SKU Kamus"
                         )
@@ -908,12 +792,12 @@ try:
                     st.metric("Total SKUs in Kamus", len(df_sku_kamus))
                     st.write("Sample SKUs:", ", ".join(df_sku_kamus['SKU'].head(3).astype(str).tolist()))
     
-    with tab2:
+    with tab2, perf_stage(perf, "render Store Overview"):
         st.markdown("### 🏪 Store Performance Overview")
         
         if not analysis_df.empty:
             # Group by store analysis
-            store_summary = analysis_df.groupby('Store_Name').agg({
+            store_summary = analysis_df.groupby('Store_Name', observed=True).agg({
                 'SKU': 'nunique',
                 'Total': 'sum',
                 'Stock_Value': 'sum',
@@ -928,7 +812,7 @@ try:
             for idx, (col, (_, row)) in enumerate(zip(cols, store_summary.iterrows())):
                 with col:
                     health_color = "#10B981" if row['Health %'] > 70 else "#F59E0B" if row['Health %'] > 40 else "#EF4444"
-                    week_cover_status = "✅" if row['Avg Week Cover'] >= 8 else "⚠️" if row['Avg Week Cover'] >= 4 else "❌"
+                    week_cover_status = "✅" if row['Avg Week Cover'] >= target_weekcover else "⚠️" if row['Avg Week Cover'] >= reorder_weeks else "❌"
                     st.markdown(f"""
                     <div class="store-card">
                         <h4 style="margin: 0 0 10px 0;">{row['Store']}</h4>
@@ -958,7 +842,7 @@ try:
             
             with col1:
                 fig1 = px.bar(store_summary, x='Store', y='Health %',
-                            title='Stock Health Score by Store (≥8 weeks target)',
+                            title=f'Stock Health Score by Store (≥{target_weekcover} weeks target)',
                             color='Health %',
                             color_continuous_scale='RdYlGn',
                             labels={'Health %': 'Health Score %'})
@@ -967,7 +851,7 @@ try:
             
             with col2:
                 # Stacked bar chart untuk status distribution per store
-                status_by_store = analysis_df.groupby(['Store_Name', 'Status']).size().unstack(fill_value=0)
+                status_by_store = analysis_df.groupby(['Store_Name', 'Status'], observed=True).size().unstack(fill_value=0)
                 fig2 = px.bar(status_by_store, 
                             title='Status Distribution by Store (Week Cover Based)',
                             barmode='stack',
@@ -975,46 +859,55 @@ try:
                 fig2.update_layout(height=400)
                 st.plotly_chart(fig2, use_container_width=True)
     
-    with tab3:
+    with tab3, perf_stage(perf, "render Priority Actions"):
         st.markdown("### 🚨 Priority Action Items (Based on Week Cover)")
         
-        # Filter SKUs yang butuh perhatian (Critical dan Need Reorder)
-        priority_items = analysis_df[analysis_df['Status'].isin(['🚨 Critical', '⚠️ Need Reorder'])]
+        # Filter SKUs yang butuh perhatian (Critical dan Need Reorder), dihitung sekali untuk semua store
+        priority_items, priority_summary = build_priority_actions(analysis_df, target_weekcover)
         
         if not priority_items.empty:
-            # Group by store untuk reorder recommendations
-            for store in priority_items['Store_Name'].unique():
-                store_items = priority_items[priority_items['Store_Name'] == store]
+            # to_dict('index') menjaga tipe per kolom (SKU_Count tetap int, tidak di-upcast ke float)
+            store_summaries = priority_summary.to_dict('index')
+            priority_stores = list(store_summaries)
+            page_start, page_stop = render_page_controls(len(priority_stores), key="priority_stores", label="stores")
+            for store in priority_stores[page_start:page_stop]:
+                store_summary = store_summaries[store]
+                store_expander = st.expander(
+                    f"**{store}** - {store_summary['SKU_Count']} SKUs Need Attention | "
+                    f"{int(store_summary['Recommended_Order']):,} units to order",
+                    key=f"priority_{store}",
+                    on_change="rerun"
+                )
+                # Tabel SKU hanya dikirim ke browser saat expander dibuka, per halaman
+                if not store_expander.open:
+                    continue
                 
-                with st.expander(f"**{store}** - {len(store_items)} SKUs Need Attention", expanded=True):
-                    # Calculate recommended order quantity untuk mencapai 8 minggu cover
-                    store_items = store_items.copy()
-                    store_items['Week_Cover_Gap'] = 8 - store_items['Week_Cover']  # Gap untuk mencapai 8 minggu
-                    store_items['Week_Cover_Gap'] = store_items['Week_Cover_Gap'].clip(lower=0.5)  # Minimal order 0.5 minggu
-                    
-                    # Hitung rekomendasi order
-                    store_items['Recommended_Order'] = (store_items['AMS'] * (store_items['Week_Cover_Gap'] / 4.33)).clip(lower=1)
-                    
-                    # Display table
-                    display_cols = ['SKU', 'SKU_Category', 'Total', 'AMS', 'Week_Cover', 'Recommended_Order', 'Status']
-                    styled_df = store_items[display_cols].sort_values('Week_Cover')
-                    
-                    # Format untuk display
-                    styled_df['Week_Cover'] = styled_df['Week_Cover'].apply(lambda x: f"{x:.1f}")
-                    styled_df['Recommended_Order'] = styled_df['Recommended_Order'].apply(lambda x: f"{int(x)} pcs")
-                    styled_df['AMS'] = styled_df['AMS'].apply(lambda x: f"{x:.1f}/month")
-                    
+                with store_expander:
+                    store_items = priority_items[priority_items['Store_Name'] == store]
+                    sku_start, sku_stop = render_page_controls(
+                        len(store_items), key=f"priority_{store}_skus", label="SKUs", default_page_size=25
+                    )
                     st.dataframe(
-                        styled_df,
+                        store_items[PRIORITY_DISPLAY_COLUMNS].iloc[sku_start:sku_stop],
                         column_config={
                             "Status": st.column_config.TextColumn(
                                 width="small",
                                 help="Stock status based on week cover"
                             ),
+                            "AMS": st.column_config.NumberColumn(
+                                "AMS",
+                                format="%.1f/month",
+                                help="Average monthly sales"
+                            ),
                             "Week_Cover": st.column_config.NumberColumn(
                                 "Week Cover",
                                 format="%.1f w",
                                 help="Current weeks of inventory cover"
+                            ),
+                            "Recommended_Order": st.column_config.NumberColumn(
+                                "Recommended Order",
+                                format="%d pcs",
+                                help=f"Order quantity to reach {target_weekcover} weeks cover"
                             )
                         },
                         use_container_width=True,
@@ -1022,59 +915,80 @@ try:
                     )
                     
                     # Total reorder summary
-                    total_reorder = store_items['Recommended_Order'].astype(str).str.replace(' pcs', '').astype(float).sum()
-                    current_weekcover = store_items['Week_Cover'].median()
-                    target_weekcover = 8
+                    current_weekcover = store_summary['Median_Week_Cover']
                     st.info(f"""
                     **Total Recommended Order for {store}:**
-                    - **{int(total_reorder):,} units** across {len(store_items)} SKUs
+                    - **{int(store_summary['Recommended_Order']):,} units** across {store_summary['SKU_Count']} SKUs
                     - **Current avg weekcover:** {current_weekcover:.1f} weeks
                     - **Target weekcover:** {target_weekcover} weeks
                     - **To reach target:** +{(target_weekcover - current_weekcover):.1f} weeks needed
                     """)
         else:
-            st.success("🎉 No critical items found! All stock levels have ≥4 weeks cover.")
+            st.success(f"🎉 No critical items found! All stock levels have ≥{reorder_weeks} weeks cover.")
     
-    with tab4:
+    with tab4, perf_stage(perf, "render Trends & Analysis"):
         st.markdown("### 📈 Trends & Category Analysis")
         
-        # Sales trend analysis
-        if not sales_filtered.empty:
-            # Monthly sales trend
-            sales_filtered['Month'] = sales_filtered['Orderdate'].dt.to_period('M')
-            monthly_sales = sales_filtered.groupby('Month').agg({
-                'ItemOrdered': 'sum',
-                'ItemPrice': lambda x: (x * sales_filtered.loc[x.index, 'ItemOrdered']).sum() / sales_filtered.loc[x.index, 'ItemOrdered'].sum()
-            }).reset_index()
-            
-            monthly_sales['Month'] = monthly_sales['Month'].dt.to_timestamp()
-            monthly_sales['Revenue'] = monthly_sales['ItemOrdered'] * monthly_sales['ItemPrice']
-            
-            # Plot trend
-            fig = make_subplots(specs=[[{"secondary_y": True}]])
-            
-            fig.add_trace(
-                go.Scatter(x=monthly_sales['Month'], y=monthly_sales['ItemOrdered'],
-                          name="Units Sold", line=dict(color='#3B82F6', width=3)),
-                secondary_y=False,
-            )
-            
-            fig.add_trace(
-                go.Bar(x=monthly_sales['Month'], y=monthly_sales['Revenue'],
-                      name="Revenue", marker_color='#10B981', opacity=0.6),
-                secondary_y=True,
+        # Sales trend analysis (dari daily sales cube, bukan scan line-item)
+        trend_col1, trend_col2 = st.columns(2)
+        with trend_col1:
+            trend_granularity = st.selectbox(
+                "Granularity:", options=['Monthly', 'Weekly', 'Daily'], index=0
             )
-            
-            fig.update_layout(
-                title="Monthly Sales Trend",
-                hovermode="x unified",
-                height=400
+        with trend_col2:
+            trend_breakdown = st.selectbox(
+                "Breakdown:", options=['Total', 'Per Store', 'Per Category'], index=0
             )
-            
-            fig.update_yaxes(title_text="Units Sold", secondary_y=False)
-            fig.update_yaxes(title_text="Revenue (Rp)", secondary_y=True)
-            
-            st.plotly_chart(fig, use_container_width=True)
+        trend_freq = {'Daily': 'D', 'Weekly': 'W', 'Monthly': 'M'}[trend_granularity]
+        trend_by = {'Total': None, 'Per Store': 'Store_Name', 'Per Category': 'SKU_Category'}[trend_breakdown]
+        
+        sales_trend = daily_cube.period_totals(
+            trend_freq, stores=selected_stores, by=trend_by,
+            sku_index=snapshot.sku_index
+        )
+        if not sales_trend.empty:
+            if trend_by is None:
+                # Plot trend
+                fig = make_subplots(specs=[[{"secondary_y": True}]])
+                
+                fig.add_trace(
+                    go.Scatter(x=sales_trend['Period'], y=sales_trend['Units'],
+                              name="Units Sold", line=dict(color='#3B82F6', width=3)),
+                    secondary_y=False,
+                )
+                
+                fig.add_trace(
+                    go.Bar(x=sales_trend['Period'], y=sales_trend['Revenue'],
+                          name="Revenue", marker_color='#10B981', opacity=0.6),
+                    secondary_y=True,
+                )
+                
+                fig.update_layout(
+                    title=f"{trend_granularity} Sales Trend",
+                    hovermode="x unified",
+                    height=400
+                )
+                
+                fig.update_yaxes(title_text="Units Sold", secondary_y=False)
+                fig.update_yaxes(title_text="Revenue (Rp)", secondary_y=True)
+                
+                st.plotly_chart(fig, use_container_width=True)
+            else:
+                col1, col2 = st.columns(2)
+                
+                with col1:
+                    fig_units = px.line(sales_trend, x='Period', y='Units', color=trend_by,
+                                        title=f'{trend_granularity} Units Sold {trend_breakdown}',
+                                        labels={'Units': 'Units Sold'})
+                    fig_units.update_layout(height=400, hovermode="x unified")
+                    st.plotly_chart(fig_units, use_container_width=True)
+                
+                with col2:
+                    fig_revenue = px.bar(sales_trend, x='Period', y='Revenue', color=trend_by,
+                                         title=f'{trend_granularity} Revenue {trend_breakdown}',
+                                         labels={'Revenue': 'Revenue (Rp)'})
+                    fig_revenue.update_layout(height=400, barmode='stack')
+                    st.plotly_chart(fig_revenue, use_container_width=True)
             
             # Weekcover Distribution Analysis
             st.markdown("#### 📊 Weekcover Distribution Analysis")
@@ -1087,10 +1001,10 @@ try:
                                      title='Distribution of Week Cover',
                                      labels={'Week_Cover': 'Weeks of Inventory Cover'},
                                      color_discrete_sequence=['#3B82F6'])
-                fig_wc1.add_vline(x=8, line_dash="dash", line_color="green", 
-                                annotation_text="Target: 8 weeks", annotation_position="top")
-                fig_wc1.add_vline(x=4, line_dash="dash", line_color="orange", 
-                                annotation_text="Min Healthy: 4 weeks", annotation_position="top")
+                fig_wc1.add_vline(x=target_weekcover, line_dash="dash", line_color="green", 
+                                annotation_text=f"Target: {target_weekcover} weeks", annotation_position="top")
+                fig_wc1.add_vline(x=reorder_weeks, line_dash="dash", line_color="orange", 
+                                annotation_text=f"Min Healthy: {reorder_weeks} weeks", annotation_position="top")
                 fig_wc1.update_layout(height=400)
                 st.plotly_chart(fig_wc1, use_container_width=True)
             
@@ -1100,28 +1014,84 @@ try:
                     fig_wc2 = px.box(analysis_df, x='SKU_Category', y='Week_Cover',
                                    title='Week Cover by SKU Category',
                                    labels={'Week_Cover': 'Weeks of Cover', 'SKU_Category': 'Category'})
-                    fig_wc2.add_hline(y=8, line_dash="dash", line_color="green", 
-                                    annotation_text="Target: 8 weeks")
+                    fig_wc2.add_hline(y=target_weekcover, line_dash="dash", line_color="green", 
+                                    annotation_text=f"Target: {target_weekcover} weeks")
                     fig_wc2.update_layout(height=400)
                     st.plotly_chart(fig_wc2, use_container_width=True)
+            
+            # Scenario comparison: semua target dihitung sekaligus, tanpa geser slider
+            st.markdown("#### 🔮 Scenario Comparison (Target Weekcover)")
+            scenario_targets = st.multiselect(
+                "Target weekcover scenarios (weeks):",
+                options=list(range(1, 27)),
+                default=[6, 8, 10, 12],
+                help="Compare replenishment needs and status distribution across several targets at once"
+            )
+            
+            if scenario_targets:
+                scenario_scope = (tuple(selected_stores), tuple(selected_categories or ()))
+                scenarios = get_weekcover_scenarios(
+                    data_version, scenario_scope, analysis_df, scenario_targets,
+                    critical_weeks, reorder_weeks, buffer_margin
+                )
+                scenario_totals = summarize_scenarios(scenarios)
+                
+                col1, col2 = st.columns(2)
+                
+                with col1:
+                    fig_sc1 = px.line(scenarios, x='Target_Weekcover', y='Replenish_Qty', color='Store_Name',
+                                      markers=True, title='Replenishment Qty by Target Weekcover',
+                                      labels={'Target_Weekcover': 'Target (weeks)', 'Replenish_Qty': 'Units', 'Store_Name': 'Store'})
+                    fig_sc1.update_layout(height=400)
+                    st.plotly_chart(fig_sc1, use_container_width=True)
+                
+                with col2:
+                    fig_sc2 = px.bar(scenario_totals, x='Target_Weekcover', y=STATUS_ORDER,
+                                     title='SKU Status Distribution by Target Weekcover',
+                                     labels={'Target_Weekcover': 'Target (weeks)', 'value': 'SKU Count', 'variable': 'Status'})
+                    fig_sc2.update_layout(height=400, barmode='stack')
+                    st.plotly_chart(fig_sc2, use_container_width=True)
+                
+                st.dataframe(
+                    scenario_totals,
+                    column_config={
+                        "Target_Weekcover": st.column_config.NumberColumn("Target", format="%d w"),
+                        "Replenish_Qty": st.column_config.NumberColumn("Replenish Qty", format="%d pcs"),
+                        "Replenish_Value": st.column_config.NumberColumn("Replenish Value", format="Rp %.0f"),
+                        "SKU_Below_Target": st.column_config.NumberColumn("SKU Below Target", format="%d"),
+                    },
+                    use_container_width=True,
+                    hide_index=True
+                )
     
     # --- FOOTER DAN DOWNLOAD ---
     st.markdown("---")
     col1, col2 = st.columns([3, 1])
     
     with col1:
-        st.caption(f"Dashboard updated: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')} | Data source: Google Sheets | Health Threshold: ≥8 weeks cover")
+        st.caption(f"Dashboard updated: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')} | Data source: Google Sheets | Health Threshold: ≥{target_weekcover} weeks cover")
     
     with col2:
         if not analysis_df.empty:
-            csv = analysis_df.to_csv(index=False).encode('utf-8')
+            # Sama dengan Detailed Analysis, jadi bytes-nya dipakai bersama lewat export cache
+            export_format = st.session_state.get('export_format', 'CSV')
             st.download_button(
                 "📥 Download Full Report",
-                csv,
-                f"flagship_inventory_report_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
-                "text/csv",
+                lazy_export(('analysis',) + analysis_scope, lambda frame=analysis_df: frame, export_format),
+                export_file_name(f"flagship_inventory_report_{datetime.now().strftime('%Y%m%d_%H%M')}", export_format),
+                EXPORT_FORMATS[export_format][1],
+                on_click="ignore",
                 use_container_width=True
             )
+    
+    
+    if perf is not None:
+        cache_stats = collect_cache_stats()
+        if show_perf_panel:
+            render_perf_panel(perf, cache_stats, refresher.last_load, refresher.reader.stats())
+        if perf_log_target:
+            configure_perf_log(perf_log_target)
+            perf_logger.info(perf.to_json(cache=cache_stats))
 
 except Exception as e:
     st.error(f"❌ An error occurred: {str(e)}")
@@ -0,0 +1,233 @@
+"""Benchmark pipeline stock health dengan data sintetis (tanpa Streamlit / Google Sheets).
+
+Data dibangkitkan dengan bentuk yang sama seperti hasil fetch Sheets (semua sel string,
+Ordernumber dengan prefix POS 4 karakter, Orderdate dd/mm/yyyy, harga dengan pemisah ribuan,
+stock per file store, dua sheet kamus), lalu setiap tahap pipeline engine diukur: waktu,
+throughput dan peak memory.
+
+Contoh:
+    python bench.py --scale medium
+    python bench.py --stores 40 --skus 20000 --months 12 --orders-per-day 300 --json bench.json
+"""
+import argparse
+import json
+import resource
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from engine import (
+    STORE_FILE_CODES, SkuIndex,
+    assemble_source_frames, prepare_sales_stock, filter_by_sku_kamus, DailySalesCube, run_stock_health,
+    summarize_inventory_control, build_inventory_control_table, store_display_names,
+    build_priority_actions, simulate_weekcover_scenarios, serialize_frame,
+)
+
+# stores x SKU x bulan order; orders_per_day = line item sales per store per hari
+BENCH_SCALES = {
+    'small': {'stores': 3, 'skus': 2_000, 'months': 6, 'orders_per_day': 50},
+    'medium': {'stores': 12, 'skus': 10_000, 'months': 12, 'orders_per_day': 150},
+    'large': {'stores': 50, 'skus': 40_000, 'months': 12, 'orders_per_day': 400},
+}
+SKU_CATEGORIES = ['Bag', 'Shoe', 'Apparel', 'Accessories', 'Wallet', 'Luggage']
+KAMUS_COVERAGE = 0.95  # Sebagian SKU sengaja tidak ada di kamus (menguji filter kamus)
+STOCK_COVERAGE = 0.8  # Peluang sebuah SKU ada di stock satu store
+
+# --- GENERATOR DATA SINTETIS ---
+def make_store_kamus(n_stores):
+    """Sheet 1 kamus: POS 4 karakter -> nama Store"""
+    pos_codes = [f"S{i:03d}" for i in range(n_stores)]
+    return pd.DataFrame({'POS': pos_codes, 'Store': [f"Store {i + 1:03d}" for i in range(n_stores)]})
+
+def make_sku_kamus(skus, rng):
+    """Sheet 2 kamus: SKU -> SKU_Category, hanya untuk sebagian SKU"""
+    listed = np.sort(rng.choice(len(skus), int(len(skus) * KAMUS_COVERAGE), replace=False))
+    return pd.DataFrame({
+        'SKU': skus[listed],
+        'SKU_Category': np.asarray(SKU_CATEGORIES)[listed % len(SKU_CATEGORIES)],
+    })
+
+def make_sales_export(pos_codes, skus, months, orders_per_day, rng, now=None):
+    """Sheet export_: line item sales, popularitas SKU mengikuti distribusi Zipf"""
+    now = now or datetime.now()
+    days = int(months * 30)
+    n_lines = len(pos_codes) * days * orders_per_day
+    
+    store_idx = rng.integers(0, len(pos_codes), n_lines)
+    day_offsets = rng.integers(0, days, n_lines)
+    sku_idx = (rng.zipf(1.3, n_lines) - 1) % len(skus)
+    unit_price = rng.integers(5, 300, len(skus)) * 1000
+    
+    dates = pd.to_datetime(now.date()) - pd.to_timedelta(day_offsets, unit='D')
+    order_numbers = pd.Series(np.asarray(pos_codes)[store_idx]) + pd.Series(np.arange(n_lines)).astype(str).str.zfill(8)
+    return pd.DataFrame({
+        'Ordernumber': order_numbers.to_numpy(),
+        'Orderdate': dates.strftime('%d/%m/%Y'),
+        'ItemSKU': skus[sku_idx],
+        'ItemPrice': pd.Series(unit_price[sku_idx]).map('{:,}'.format).to_numpy(),
+        'ItemOrdered': rng.integers(1, 4, n_lines).astype(str),
+    }, dtype=str)
+
+def make_stock_files(pos_codes, skus, rng):
+    """Satu frame stock per file source (amb/bsb/mcd); store dibagi round-robin ke file tersebut"""
+    files = {key: [] for key in STORE_FILE_CODES}
+    file_keys = list(STORE_FILE_CODES)
+    for i, pos in enumerate(pos_codes):
+        in_stock = rng.random(len(skus)) < STOCK_COVERAGE
+        files[file_keys[i % len(file_keys)]].append(pd.DataFrame({
+            'Location Code': pos,
+            'SKU': skus[in_stock],
+            'Total': rng.integers(0, 60, int(in_stock.sum())).astype(str),
+        }, dtype=str))
+    return {key: pd.concat(frames, ignore_index=True) for key, frames in files.items() if frames}
+
+def generate_sources(stores, skus, months, orders_per_day, seed=0):
+    """Frame mentah per nama source, sama seperti hasil fetch_source_frames()"""
+    rng = np.random.default_rng(seed)
+    store_kamus = make_store_kamus(stores)
+    sku_codes = np.asarray([f"SKU{i:06d}" for i in range(skus)], dtype=object)
+    pos_codes = store_kamus['POS'].tolist()
+    return {
+        'store_kamus': store_kamus,
+        'sku_kamus': make_sku_kamus(sku_codes, rng),
+        'export': make_sales_export(pos_codes, sku_codes, months, orders_per_day, rng),
+        **make_stock_files(pos_codes, sku_codes, rng),
+    }
+
+# --- PENGUKURAN PER TAHAP ---
+class StageTimer:
+    """Catat durasi, jumlah baris dan peak memory (tracemalloc) per tahap"""
+    
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.results = []
+    
+    def run(self, stage, fn, rows=None):
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        value = fn()
+        seconds = time.perf_counter() - start
+        peak_mb = None
+        if self.trace_memory:
+            peak_mb = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+            tracemalloc.stop()
+        
+        row_count = rows(value) if callable(rows) else rows
+        self.results.append({
+            'stage': stage,
+            'seconds': seconds,
+            'rows': row_count,
+            'rows_per_sec': row_count / seconds if row_count and seconds > 0 else None,
+            'peak_mb': peak_mb,
+        })
+        return value
+
+def run_pipeline(sources, timer, scenario_targets=tuple(range(4, 24))):
+    """Jalankan tahap-tahap pipeline dashboard secara berurutan dengan timer"""
+    n_sales = len(sources['export'])
+    quiet = lambda level, message: None
+    
+    df_sales, df_store_kamus, df_sku_kamus, df_stock = timer.run(
+        'ingest (schema + date parsing)', lambda: assemble_source_frames(sources, notify=quiet), rows=n_sales
+    )
+    df_sales_mapped, df_stock = timer.run(
+        'POS mapping', lambda: prepare_sales_stock(df_sales, df_store_kamus, df_stock), rows=n_sales
+    )
+    sku_index = timer.run('kamus index', lambda: SkuIndex(df_sku_kamus), rows=len(df_sku_kamus))
+    timer.run('kamus filtering', lambda: filter_by_sku_kamus(df_stock, sku_index), rows=len(df_stock))
+    daily_cube = timer.run('daily sales cube', lambda: DailySalesCube.from_sales(df_sales_mapped), rows=n_sales)
+    analysis_df = timer.run(
+        'stock health', lambda: run_stock_health(df_stock, df_sales_mapped, sku_index, daily_cube), rows=len(df_stock)
+    )
+    
+    def control_tables():
+        control_metrics = summarize_inventory_control(analysis_df)
+        display_names = store_display_names(df_store_kamus)
+        return [
+            build_inventory_control_table(display_names.get(store, store), raw_metrics)
+            for store, raw_metrics in control_metrics.to_dict('index').items()
+        ]
+    
+    timer.run('per-store control tables', control_tables, rows=len(analysis_df))
+    timer.run('priority actions', lambda: build_priority_actions(analysis_df, 8), rows=len(analysis_df))
+    timer.run(
+        f'scenarios ({len(scenario_targets)} targets)',
+        lambda: simulate_weekcover_scenarios(analysis_df, scenario_targets), rows=len(analysis_df) * len(scenario_targets)
+    )
+    timer.run('trend monthly', lambda: daily_cube.period_totals('M'), rows=len(daily_cube.frame))
+    timer.run(
+        'trend weekly per category',
+        lambda: daily_cube.period_totals('W', by='SKU_Category', sku_index=sku_index), rows=len(daily_cube.frame)
+    )
+    timer.run('export csv', lambda: serialize_frame(analysis_df, 'CSV'), rows=len(analysis_df))
+    return analysis_df
+
+def format_report(config, results, total_seconds):
+    lines = [
+        f"Scale: {config['stores']} stores x {config['skus']:,} SKUs x {config['months']} bulan "
+        f"x {config['orders_per_day']} line/store/hari",
+        f"{'stage':<32} {'seconds':>9} {'rows':>12} {'rows/s':>14} {'peak MB':>9}",
+    ]
+    for r in results:
+        rows_per_sec = f"{r['rows_per_sec']:,.0f}" if r['rows_per_sec'] else '-'
+        peak_mb = f"{r['peak_mb']:.1f}" if r['peak_mb'] is not None else '-'
+        lines.append(f"{r['stage']:<32} {r['seconds']:>9.3f} {r['rows'] or 0:>12,} {rows_per_sec:>14} {peak_mb:>9}")
+    lines.append(f"{'total':<32} {total_seconds:>9.3f}")
+    return "\n".join(lines)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark pipeline stock health dengan data sintetis")
+    parser.add_argument("--scale", choices=list(BENCH_SCALES), default='small')
+    parser.add_argument("--stores", type=int)
+    parser.add_argument("--skus", type=int)
+    parser.add_argument("--months", type=int)
+    parser.add_argument("--orders-per-day", type=int, help="Line item sales per store per hari")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-trace-memory", action="store_true",
+                        help="Matikan tracemalloc (timing lebih akurat, tanpa peak memory per tahap)")
+    parser.add_argument("--json", help="Simpan hasil ke file JSON (untuk membandingkan antar versi)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = dict(BENCH_SCALES[args.scale])
+    for key in config:
+        if getattr(args, key) is not None:
+            config[key] = getattr(args, key)
+    
+    started = time.perf_counter()
+    sources = generate_sources(seed=args.seed, **config)
+    generate_seconds = time.perf_counter() - started
+    print(f"Data sintetis: {len(sources['export']):,} baris sales, "
+          f"{sum(len(sources[key]) for key in STORE_FILE_CODES if key in sources):,} baris stock "
+          f"({generate_seconds:.1f}s)")
+    
+    timer = StageTimer(trace_memory=not args.no_trace_memory)
+    started = time.perf_counter()
+    run_pipeline(sources, timer)
+    total_seconds = time.perf_counter() - started
+    
+    # ru_maxrss dalam KB di Linux (byte di macOS)
+    max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+    print(format_report(config, timer.results, total_seconds))
+    print(f"Peak RSS proses: {max_rss_mb:.0f} MB")
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'config': config,
+                'seed': args.seed,
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'total_seconds': total_seconds,
+                'max_rss_mb': max_rss_mb,
+                'stages': timer.results,
+            }, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
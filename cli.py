@@ -0,0 +1,128 @@
+"""CLI batch: hitung stock health dan tulis laporan inventory control tanpa Streamlit.
+
+Contoh:
+    python cli.py --source-dir .cache/snapshots --output-dir reports
+    python cli.py --credentials service_account.json --format parquet
+"""
+import argparse
+import json
+import logging
+import re
+import sys
+import time
+from pathlib import Path
+
+from engine import (
+    SHEETS_MAX_WORKERS, SNAPSHOT_DIR, DEFAULT_WEEKCOVER_THRESHOLDS, PRIORITY_DISPLAY_COLUMNS,
+    SkuIndex, SnapshotStore, SheetsReader,
+    authorize_gspread, find_source_files, load_source_frames, read_local_sources, assemble_source_frames,
+    prepare_sales_stock, load_daily_sales_cube, run_stock_health, recalculate_weekcover_status,
+    weekcover_thresholds, summarize_inventory_control, store_display_names, inventory_control_report,
+    build_priority_actions, serialize_frame, export_file_name,
+)
+
+logger = logging.getLogger("stock_health_cli")
+
+# Pilihan --format -> nama format di EXPORT_FORMATS
+CLI_FORMATS = {
+    'csv': 'CSV',
+    'csv.gz': 'CSV (gzip)',
+    'csv.zst': 'CSV (zstd)',
+    'parquet': 'Parquet',
+}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate laporan stock health & inventory control per store")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--source-dir", type=Path,
+                        help="Folder berisi store_kamus, sku_kamus, export, amb, bsb, mcd (.parquet atau .csv)")
+    source.add_argument("--credentials", type=Path,
+                        help="File JSON service account untuk membaca langsung dari Google Sheets")
+    parser.add_argument("--output-dir", type=Path, default=Path("reports"))
+    parser.add_argument("--format", choices=list(CLI_FORMATS), default="csv")
+    parser.add_argument("--stores", nargs="+", help="Hanya store ini (default: semua store)")
+    parser.add_argument("--target-weekcover", type=int, default=DEFAULT_WEEKCOVER_THRESHOLDS[2])
+    parser.add_argument("--critical", type=int, default=DEFAULT_WEEKCOVER_THRESHOLDS[0])
+    parser.add_argument("--reorder", type=int, default=DEFAULT_WEEKCOVER_THRESHOLDS[1])
+    parser.add_argument("--buffer-margin", type=int,
+                        default=DEFAULT_WEEKCOVER_THRESHOLDS[3] - DEFAULT_WEEKCOVER_THRESHOLDS[2])
+    parser.add_argument("--cache-dir", type=Path, default=SNAPSHOT_DIR,
+                        help="Folder snapshot Parquet untuk mode Google Sheets")
+    parser.add_argument("--max-workers", type=int, default=SHEETS_MAX_WORKERS)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    return parser.parse_args(argv)
+
+def load_inputs(args):
+    """Return (df_sales, df_store_kamus, df_sku_kamus, df_stock, source_files); source_files None untuk file lokal"""
+    if args.source_dir:
+        frames = read_local_sources(args.source_dir)
+        return (*assemble_source_frames(frames), None)
+    
+    gc = authorize_gspread(json.loads(args.credentials.read_text()))
+    reader = SheetsReader(gc)
+    source_files = reader.call('drive', lambda: find_source_files(gc), rate_limited=False)
+    df_sales, df_store_kamus, df_sku_kamus, df_stock, _ = load_source_frames(
+        gc, source_files, max_workers=args.max_workers, snapshot_store=SnapshotStore(args.cache_dir), reader=reader
+    )
+    for label, metrics in reader.stats().items():
+        logger.info("Sheets %s: %d request, %d retry (%d x 429), latency %.2fs",
+                    label, metrics['requests'], metrics['retries'], metrics['throttled'], metrics['latency_s'])
+    return df_sales, df_store_kamus, df_sku_kamus, df_stock, source_files
+
+def _file_slug(name):
+    return re.sub(r"[^0-9A-Za-z]+", "_", str(name)).strip("_").lower() or "store"
+
+def write_reports(analysis_df, df_store_kamus, thresholds, output_dir, export_format):
+    """Tulis laporan inventory control, detail, priority actions dan satu file detail per store"""
+    written = []
+    
+    def write(name, df):
+        path = output_dir / export_file_name(name, export_format)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(serialize_frame(df, export_format))
+        written.append(path)
+    
+    control_metrics = summarize_inventory_control(analysis_df, thresholds)
+    write("inventory_control", inventory_control_report(control_metrics, store_display_names(df_store_kamus)))
+    write("detailed_analysis", analysis_df)
+    
+    priority_items, _ = build_priority_actions(analysis_df, thresholds[2])
+    write("priority_actions", priority_items[['Store_Name'] + PRIORITY_DISPLAY_COLUMNS])
+    
+    for store, store_df in analysis_df.groupby('Store_Name', observed=True):
+        write(f"stores/{_file_slug(store)}", store_df)
+    
+    return written
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format="%(levelname)s %(message)s")
+    started = time.perf_counter()
+    
+    df_sales, df_store_kamus, df_sku_kamus, df_stock, source_files = load_inputs(args)
+    if df_store_kamus is None:
+        logger.error("Kamus tidak bisa dipakai, laporan tidak dibuat")
+        return 1
+    
+    df_sales_mapped, df_stock = prepare_sales_stock(df_sales, df_store_kamus, df_stock)
+    daily_cube = load_daily_sales_cube(
+        df_sales_mapped, source_files, SnapshotStore(args.cache_dir) if source_files else None
+    )
+    analysis_df = run_stock_health(df_stock, df_sales_mapped, SkuIndex(df_sku_kamus), daily_cube)
+    
+    thresholds = weekcover_thresholds(args.target_weekcover, args.critical, args.reorder, args.buffer_margin)
+    if thresholds != DEFAULT_WEEKCOVER_THRESHOLDS:
+        analysis_df = recalculate_weekcover_status(analysis_df, thresholds)
+    if args.stores and not analysis_df.empty:
+        analysis_df = analysis_df[analysis_df['Store_Name'].isin(args.stores)]
+    if analysis_df.empty:
+        logger.error("Tidak ada data stock untuk dianalisis")
+        return 1
+    
+    written = write_reports(analysis_df, df_store_kamus, thresholds, args.output_dir, CLI_FORMATS[args.format])
+    print(f"{len(written)} file ditulis ke {args.output_dir} "
+          f"({len(analysis_df):,} baris SKU-store, {time.perf_counter() - started:.1f}s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1879 @@
+"""Engine analisis stock health tanpa UI.
+
+Loading data (Google Sheets / snapshot / file lokal), klasifikasi week cover, inventory
+control, priority actions dan export. Dipakai dashboard Streamlit (app.py) dan CLI batch
+(cli.py); modul ini tidak meng-import Streamlit.
+"""
+import os
+import json
+import time
+import random
+import logging
+import threading
+from collections import Counter, OrderedDict
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import gspread
+from gspread.utils import rowcol_to_a1, absolute_range_name
+from google.oauth2.service_account import Credentials
+
+logger = logging.getLogger(__name__)
+
+# --- PESAN LOADING (TANPA UI) ---
+# Level pesan dari loading: caption/success/notice = status sumber data,
+# warning/error = masalah data yang perlu dilihat user
+NOTIFY_LOG_LEVELS = {
+    'caption': logging.INFO,
+    'success': logging.INFO,
+    'notice': logging.WARNING,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+}
+
+def log_message(level, message):
+    """Notifier default: teruskan pesan loading ke logging"""
+    logger.log(NOTIFY_LOG_LEVELS.get(level, logging.INFO), message)
+
+# --- INSTRUMENTASI (TIMING, ROWS & MEMORI PER TAHAP) ---
+perf_logger = logging.getLogger("dashboard.perf")
+
+class PerfRecorder:
+    """Timing, jumlah baris dan memori frame per tahap untuk satu run (rerun dashboard / CLI).
+
+    Pemakaian: `with recorder.stage('nama') as stage: ...` lalu isi `stage['frame'] = df`
+    (atau `stage['rows']`, `stage['cached']`) di dalam blok.
+    """
+    
+    def __init__(self, run_name="dashboard_run"):
+        self.run_name = run_name
+        self.started = time.perf_counter()
+        self.stages = []
+    
+    @contextmanager
+    def stage(self, name):
+        info = {}
+        start = time.perf_counter()
+        try:
+            yield info
+        finally:
+            self.add(name, time.perf_counter() - start, **info)
+    
+    def add(self, name, seconds, frame=None, rows=None, cached=None):
+        frames = frame if isinstance(frame, (list, tuple)) else [frame]
+        frames = [f for f in frames if isinstance(f, pd.DataFrame)]
+        if rows is None and frames:
+            rows = sum(len(f) for f in frames)
+        self.stages.append({
+            'stage': name,
+            'seconds': round(seconds, 4),
+            'rows': rows,
+            'memory_mb': round(frame_memory_mb(*frames), 2) if frames else None,
+            'cached': cached,
+        })
+    
+    def total_seconds(self):
+        return time.perf_counter() - self.started
+    
+    def to_json(self, **extra):
+        return json.dumps({
+            'event': self.run_name,
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'total_seconds': round(self.total_seconds(), 4),
+            'stages': self.stages,
+            **extra,
+        }, default=str)
+
+def perf_stage(recorder, name):
+    """recorder.stage(name), atau no-op jika instrumentasi tidak aktif (recorder None)"""
+    return recorder.stage(name) if recorder is not None else nullcontext({})
+
+class CacheCounters:
+    """Counter hit/miss per cache, dipakai bersama semua session.
+
+    `call` dicatat pemanggil setiap kali fungsi di-cache dipanggil, `miss` dari dalam
+    fungsinya (body hanya jalan saat cache miss); hit = call - miss.
+    """
+    
+    def __init__(self):
+        self._calls = Counter()
+        self._misses = Counter()
+        self._lock = threading.Lock()
+    
+    def call(self, name):
+        with self._lock:
+            self._calls[name] += 1
+    
+    def miss(self, name):
+        with self._lock:
+            self._misses[name] += 1
+    
+    def misses(self, name):
+        return self._misses[name]
+    
+    def stats(self):
+        with self._lock:
+            return {
+                name: {'hits': max(self._calls[name] - self._misses[name], 0), 'misses': self._misses[name]}
+                for name in sorted(set(self._calls) | set(self._misses))
+            }
+
+# --- KONFIGURASI SUMBER DATA ---
+KAMUS_SPREADSHEET = "Offline Store Kamus"
+SOURCE_WORKSHEET_INDEX = {'sku_kamus': 1}  # Worksheet selain yang pertama (default index 0)
+SHEETS_MAX_WORKERS = 6  # Jumlah worksheet yang di-fetch bersamaan
+
+def fetch_sheets_concurrently(fetchers, max_workers=SHEETS_MAX_WORKERS):
+    """Jalankan fetcher worksheet secara paralel dan catat durasi per source.
+
+    `fetchers` adalah dict nama_source -> callable tanpa argumen (mis. fungsi yang
+    memanggil `SheetsReader.read_worksheets()`). Tidak memanggil Streamlit sama sekali,
+    sehingga aman dijalankan di thread lain dan bisa diuji dengan client gspread palsu.
+
+    Return: (results, errors, timings) - masing-masing dict per nama source.
+    """
+    results, errors, timings = {}, {}, {}
+    
+    def timed_fetch(name, fetcher):
+        start = time.perf_counter()
+        try:
+            return fetcher()
+        finally:
+            timings[name] = time.perf_counter() - start
+    
+    if not fetchers:
+        return results, errors, timings
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(fetchers)))) as pool:
+        futures = {pool.submit(timed_fetch, name, fetcher): name for name, fetcher in fetchers.items()}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                errors[name] = e
+    
+    return results, errors, timings
+
+# --- READ LAYER SHEETS (BATCH, RATE LIMIT, BACKOFF) ---
+# Kuota default Sheets API: 60 read request/menit per user per project. Budget dibagi
+# antar replika lewat env var, mis. 3 replika -> SHEETS_READS_PER_MINUTE=20
+SHEETS_READS_PER_MINUTE = float(os.environ.get("SHEETS_READS_PER_MINUTE", 50))
+SHEETS_READ_BURST = 10  # Request yang boleh langsung jalan tanpa menunggu token
+SHEETS_MAX_RETRIES = 5
+SHEETS_BACKOFF_BASE = 1.0  # Detik; delay retry ke-n acak di [0, base * 2^n] (full jitter)
+SHEETS_BACKOFF_MAX = 32.0
+SHEETS_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """Rate limiter token bucket, thread-safe: `rate_per_minute` token/menit, burst `capacity`"""
+    
+    def __init__(self, rate_per_minute=SHEETS_READS_PER_MINUTE, capacity=SHEETS_READ_BURST,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate_per_minute / 60
+        self.capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(capacity)
+        self._updated = clock()
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """Ambil satu token (menunggu bila habis); return lama menunggu dalam detik"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            self._sleep(delay)
+            waited += delay
+
+# Satu bucket untuk semua reader di proses ini (refresher dashboard, CLI)
+SHEETS_RATE_LIMITER = TokenBucket()
+
+def _api_error_status(error):
+    status = getattr(error, 'code', None)
+    if status in (None, -1) and getattr(error, 'response', None) is not None:
+        status = error.response.status_code
+    return status
+
+class SheetsReader:
+    """Read layer Google Sheets: satu values:batchGet per spreadsheet, rate limit dan retry.
+
+    Semua worksheet yang dibutuhkan dari satu spreadsheet (mis. dua sheet kamus) dibaca
+    dengan satu request. Judul worksheet di-cache per file, jadi refresh berikutnya tidak
+    perlu metadata call. Setiap request mengambil token dari `rate_limiter`; error 429/5xx
+    di-retry dengan exponential backoff + jitter. Metrics per label (source) ada di stats().
+
+    Client cukup punya `http_client.values_batch_get()` dan `http_client.fetch_sheet_metadata()`
+    (gspread >= 6), sehingga bisa diuji dengan client palsu yang menyuntikkan 429 / delay.
+    """
+    
+    def __init__(self, gc, rate_limiter=None, max_retries=SHEETS_MAX_RETRIES,
+                 backoff_base=SHEETS_BACKOFF_BASE, backoff_max=SHEETS_BACKOFF_MAX,
+                 sleep=time.sleep, jitter=random.uniform):
+        self.gc = gc
+        self.rate_limiter = rate_limiter or SHEETS_RATE_LIMITER
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._sleep = sleep
+        self._jitter = jitter
+        self._titles = {}
+        self._metrics = {}
+        self._lock = threading.Lock()
+    
+    def _record(self, label, **values):
+        with self._lock:
+            metrics = self._metrics.setdefault(label, {
+                'requests': 0, 'retries': 0, 'throttled': 0, 'errors': 0,
+                'rate_wait_s': 0.0, 'backoff_s': 0.0, 'latency_s': 0.0, 'last_latency_s': None,
+            })
+            for key, value in values.items():
+                if key == 'last_latency_s':
+                    metrics[key] = value
+                else:
+                    metrics[key] += value
+    
+    def call(self, label, fn, rate_limited=True):
+        """Jalankan satu API request dengan rate limit dan retry untuk 429/5xx"""
+        for attempt in range(self.max_retries + 1):
+            waited = self.rate_limiter.acquire() if rate_limited else 0.0
+            start = time.perf_counter()
+            try:
+                result = fn()
+            except gspread.exceptions.APIError as e:
+                status = _api_error_status(e)
+                self._record(label, requests=1, rate_wait_s=waited, throttled=int(status == 429))
+                if status not in SHEETS_RETRY_STATUS or attempt == self.max_retries:
+                    self._record(label, errors=1)
+                    raise
+                delay = self._jitter(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                logger.warning("Sheets %s: HTTP %s, retry %d dalam %.1fs", label, status, attempt + 1, delay)
+                self._record(label, retries=1, backoff_s=delay)
+                self._sleep(delay)
+                continue
+            latency = time.perf_counter() - start
+            self._record(label, requests=1, rate_wait_s=waited, latency_s=latency, last_latency_s=latency)
+            return result
+    
+    def resolve_file_id(self, title, label=None):
+        """File id spreadsheet berdasarkan nama (fallback bila belum ada dari Drive listing)"""
+        return self.call(label or title, lambda: self.gc.open(title).id)
+    
+    def worksheet_titles(self, file_id, label=None, refresh=False):
+        """Judul worksheet urut index (di-cache per file)"""
+        if refresh or file_id not in self._titles:
+            metadata = self.call(label or file_id, lambda: self.gc.http_client.fetch_sheet_metadata(
+                file_id, params={'fields': 'sheets.properties(index,title)'}
+            ))
+            sheets = sorted((sheet['properties'] for sheet in metadata.get('sheets', [])), key=lambda p: p.get('index', 0))
+            self._titles[file_id] = [p['title'] for p in sheets]
+        return self._titles[file_id]
+    
+    def read_ranges(self, file_id, ranges, label=None):
+        """Nilai (list 2D, formatted) untuk beberapa range A1 dalam satu request"""
+        response = self.call(label or file_id, lambda: self.gc.http_client.values_batch_get(file_id, list(ranges)))
+        return [value_range.get('values', []) for value_range in response.get('valueRanges', [])]
+    
+    def read_worksheet_ranges(self, file_id, ranges, label=None):
+        """Nilai untuk (index worksheet, range A1 atau None = seluruh sheet) dalam satu request"""
+        for refresh in (False, True):
+            titles = self.worksheet_titles(file_id, label, refresh=refresh)
+            try:
+                return self.read_ranges(
+                    file_id, [absolute_range_name(titles[index], a1_range) for index, a1_range in ranges], label
+                )
+            except gspread.exceptions.APIError as e:
+                # Judul di cache sudah usang (worksheet di-rename): ambil ulang metadata sekali
+                if refresh or _api_error_status(e) != 400:
+                    raise
+    
+    def read_worksheets(self, file_id, worksheet_indexes, label=None):
+        """Semua nilai beberapa worksheet (by index) dari satu spreadsheet; return list per index"""
+        return self.read_worksheet_ranges(file_id, [(index, None) for index in worksheet_indexes], label)
+    
+    def stats(self):
+        with self._lock:
+            return {label: dict(metrics) for label, metrics in sorted(self._metrics.items())}
+
+def _pad_rows(rows, width):
+    """Samakan panjang baris dengan header (API memangkas sel kosong di ujung baris)"""
+    return [row if len(row) == width else (list(row) + [''] * width)[:width] for row in rows]
+
+def values_to_frame(values):
+    """Nilai mentah worksheet (baris pertama = header) -> DataFrame kolom string.
+
+    Tanpa dict per baris dan tanpa numeric guessing per sel seperti get_all_records();
+    kolom angka dikonversi vectorized saat ingestion (lihat to_number()).
+    """
+    if len(values) < 2:
+        return pd.DataFrame()
+    header = values[0]
+    return pd.DataFrame(_pad_rows(values[1:], len(header)), columns=header, dtype=str)
+
+# --- SNAPSHOT LOKAL (PARQUET) ---
+DATA_CACHE_DIR = Path(os.environ.get("DASHBOARD_CACHE_DIR", ".cache"))
+SNAPSHOT_DIR = DATA_CACHE_DIR / "snapshots"
+_SNAPSHOT_LOCK = threading.Lock()
+# Naikkan jika isi snapshot berubah format; snapshot format lama dianggap tidak ada
+# (2 = nilai mentah string dari batchGet, tanpa numeric guessing get_all_records)
+SNAPSHOT_FORMAT = 2
+
+def _write_atomic(path, write_fn):
+    """Tulis file lewat file sementara lalu rename, supaya pembaca tidak melihat file setengah jadi"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    write_fn(tmp_path)
+    os.replace(tmp_path, path)
+
+def coerce_frame_types(df):
+    """Pastikan setiap kolom punya satu tipe (syarat Parquet).
+
+    File CSV lokal / snapshot lama bisa punya kolom campuran angka dan string. Kolom campuran
+    yang isinya angka semua (kecuali sel kosong) dijadikan numeric, sisanya jadi string.
+    """
+    df = df.copy()
+    for col in df.columns:
+        values = df[col]
+        if not pd.api.types.is_object_dtype(values) or values.dropna().map(type).nunique() <= 1:
+            continue
+        non_blank = values[values.notna() & (values != '')]
+        if pd.to_numeric(non_blank, errors='coerce').notna().all():
+            df[col] = pd.to_numeric(values.replace('', np.nan), errors='coerce')
+        else:
+            df[col] = values.where(values.isna(), values.astype(str))
+    return df
+
+class SnapshotStore:
+    """Snapshot Parquet per source + manifest JSON berisi modifiedTime dari Drive.
+
+    Source yang modifiedTime-nya tidak berubah sejak snapshot terakhir dibaca ulang dari
+    disk (memory-mapped), sehingga restart server tidak perlu download ulang sheet.
+    """
+    
+    def __init__(self, root=SNAPSHOT_DIR):
+        self.root = Path(root)
+        self.manifest_path = self.root / "manifest.json"
+    
+    def _load_manifest(self):
+        try:
+            return json.loads(self.manifest_path.read_text())
+        except (OSError, ValueError):
+            return {}
+    
+    def _frame_path(self, name):
+        return self.root / f"{name}.parquet"
+    
+    def entry(self, name):
+        """Metadata snapshot untuk source `name` (None jika belum ada)"""
+        entry = self._load_manifest().get(name)
+        if entry is None or entry.get('format') != SNAPSHOT_FORMAT or not self._frame_path(name).exists():
+            return None
+        return entry
+    
+    def is_fresh(self, name, file_id, modified_time):
+        """True jika snapshot ada dan file sumber belum berubah sejak di-snapshot"""
+        entry = self.entry(name)
+        return (
+            entry is not None
+            and modified_time is not None
+            and entry.get('file_id') == file_id
+            and entry.get('modified_time') == modified_time
+        )
+    
+    def read(self, name):
+        return pd.read_parquet(self._frame_path(name), memory_map=True)
+    
+    def write(self, name, df, file_id=None, modified_time=None, **extra):
+        """Simpan frame sebagai Parquet lalu update manifest; return frame yang sudah bertipe"""
+        df = coerce_frame_types(df)
+        with _SNAPSHOT_LOCK:
+            _write_atomic(self._frame_path(name), lambda tmp: df.to_parquet(tmp, index=False))
+            manifest = self._load_manifest()
+            manifest[name] = {
+                'file_id': file_id,
+                'modified_time': modified_time,
+                'rows': len(df),
+                'format': SNAPSHOT_FORMAT,
+                'written_at': datetime.now().isoformat(timespec='seconds'),
+                **extra,
+            }
+            _write_atomic(self.manifest_path, lambda tmp: tmp.write_text(json.dumps(manifest, indent=2)))
+        return df
+
+# --- INCREMENTAL SYNC SALES EXPORT ---
+def sync_sales_export(reader, file_id, snapshot_store, modified_time=None):
+    """Sinkronisasi incremental sheet export_ ke snapshot lokal.
+
+    Sheet sales hanya di-append, jadi cukup ambil baris setelah baris terakhir yang sudah
+    di-ingest. Header dan baris baru dibaca dalam satu batchGet lewat `reader`
+    (SheetsReader). Baris terakhir yang tersimpan ikut diambil ulang sebagai penanda: kalau
+    isinya berbeda (sheet diganti/di-sort/dihapus) atau header berubah, fallback ke full download.
+
+    Return: (df_sales, info) dengan info berisi mode sync dan jumlah baris baru.
+    """
+    state = snapshot_store.entry('export') or {}
+    stored_header = state.get('header')
+    df_stored = None
+    if state.get('file_id') == file_id and stored_header:
+        try:
+            df_stored = snapshot_store.read('export')
+        except Exception:
+            df_stored = None
+    
+    mode = 'full'
+    new_rows = []
+    header = None
+    if df_stored is not None and len(df_stored) == state.get('rows'):
+        rows_ingested = state['rows']
+        last_col = rowcol_to_a1(1, len(stored_header)).rstrip('0123456789')
+        # Mulai dari baris terakhir yang sudah di-ingest (+1 untuk header) sebagai penanda
+        start_row = rows_ingested + 1 if rows_ingested > 0 else 2
+        header_values, delta_values = reader.read_worksheet_ranges(
+            file_id, [(0, '1:1'), (0, f"A{start_row}:{last_col}")], 'export'
+        )
+        header = header_values[0] if header_values else []
+        
+        if header == stored_header:
+            delta_rows = _pad_rows(delta_values, len(header))
+            if rows_ingested > 0:
+                anchor_ok = bool(delta_rows) and [str(v) for v in delta_rows[0]] == state.get('last_row')
+                delta_rows = delta_rows[1:]
+            else:
+                anchor_ok = True
+            
+            if anchor_ok:
+                mode = 'incremental'
+                new_rows = delta_rows
+                if new_rows:
+                    df_sales = pd.concat([df_stored, pd.DataFrame(new_rows, columns=header, dtype=str)], ignore_index=True)
+                else:
+                    df_sales = df_stored
+    
+    if mode == 'full':
+        values = reader.read_worksheets(file_id, [0], 'export')[0]
+        header = values[0] if values else []
+        df_sales = values_to_frame(values)
+        new_rows = _pad_rows(values[-1:], len(header)) if len(values) > 1 else []
+    
+    if mode == 'full' or new_rows or state.get('modified_time') != modified_time:
+        df_sales = snapshot_store.write(
+            'export', df_sales, file_id=file_id, modified_time=modified_time,
+            header=header,
+            last_row=[str(v) for v in new_rows[-1]] if new_rows else state.get('last_row', []),
+        )
+    
+    new_count = len(df_sales) if mode == 'full' else len(new_rows)
+    return df_sales, {'mode': mode, 'new_rows': new_count, 'total_rows': len(df_sales)}
+
+# --- SCHEMA INGESTION (DTYPE KOMPAK) ---
+PRICE_DTYPE = "float64"  # Ganti ke "float32" untuk menghemat memori kolom harga
+# Format Orderdate dari export POS (hari dulu); dicoba berurutan sebelum fallback dayfirst
+ORDERDATE_FORMATS = ('%d/%m/%Y', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M')
+
+# Tipe kolom per frame: string bercardinality rendah -> category, qty -> int32
+INGESTION_SCHEMA = {
+    'sales': {
+        'Ordernumber': 'string',
+        'Orderdate': 'datetime',
+        'ItemSKU': 'category',
+        'ItemPrice': 'price',
+        'ItemOrdered': 'quantity',
+    },
+    'stock': {
+        'Location Code': 'category',
+        'SKU': 'category',
+        'Total': 'quantity',
+        'Store_Code': 'category',
+    },
+    'sku_kamus': {
+        'SKU_Category': 'category',
+    },
+}
+
+def parse_dates(values, formats=ORDERDATE_FORMATS):
+    """Parse kolom tanggal ke datetime64, hanya sekali per nilai unik.
+
+    Tanggal order sangat berulang (ribuan baris per hari), jadi nilai unik di-parse dengan
+    format eksplisit lalu dipetakan balik lewat kode factorize. Nilai yang tidak cocok
+    format mana pun di-parse dengan dayfirst=True; sisanya jadi NaT.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    codes, uniques = pd.factorize(values)
+    text = pd.Series(uniques, dtype=object).astype(str).str.strip()
+    
+    parsed = pd.Series(pd.NaT, index=text.index, dtype='datetime64[us]')
+    for fmt in formats:
+        missing = parsed.isna()
+        if not missing.any():
+            break
+        parsed[missing] = pd.to_datetime(text[missing], format=fmt, errors='coerce')
+    missing = parsed.isna()
+    if missing.any():
+        parsed[missing] = pd.to_datetime(text[missing], format='mixed', dayfirst=True, errors='coerce')
+    
+    # Kode -1 (sel kosong/NaN) mengambil elemen terakhir, yaitu NaT yang ditambahkan di sini
+    lookup = np.append(parsed.to_numpy(), np.datetime64('NaT', 'us'))
+    return pd.Series(lookup[codes], index=values.index, name=values.name)
+
+def to_number(values):
+    """Kolom angka dari Sheets -> numeric secara vectorized; sel kosong/non-angka jadi NaN.
+
+    Nilai formatted bisa memakai pemisah ribuan ("12,500"), jadi koma dibuang dulu
+    (sama seperti numeric guessing gspread). Harga dan qty sangat berulang, jadi yang
+    dikonversi hanya nilai uniknya lalu dipetakan balik lewat kode factorize.
+    """
+    if pd.api.types.is_numeric_dtype(values):
+        return values
+    codes, uniques = pd.factorize(values)
+    text = pd.Series(uniques, dtype=object).astype(str).str.replace(',', '', regex=False)
+    numbers = pd.to_numeric(text, errors='coerce').to_numpy(dtype='float64')
+    # Kode -1 (NaN) mengambil elemen terakhir, yaitu NaN yang ditambahkan di sini
+    return pd.Series(np.append(numbers, np.nan)[codes], index=values.index, name=values.name)
+
+def apply_ingestion_schema(df, schema):
+    """Konversi kolom sesuai schema. Kolom yang tidak ada di frame dilewati.
+
+    Quantity jadi int32; jika ada nilai kosong/non-angka atau pecahan, jadi float32.
+    """
+    df = df.copy()
+    for col, kind in schema.items():
+        if col not in df.columns:
+            continue
+        if kind == 'category':
+            df[col] = df[col].astype('category')
+        elif kind == 'string':
+            df[col] = df[col].astype(str)
+        elif kind == 'datetime':
+            df[col] = parse_dates(df[col])
+        elif kind == 'price':
+            df[col] = to_number(df[col]).astype(PRICE_DTYPE)
+        elif kind == 'quantity':
+            values = to_number(df[col])
+            # int32 hanya jika semua terisi dan bulat; qty pecahan (mis. 1.5) tidak boleh terpotong
+            is_integer = not values.isna().any() and (values % 1 == 0).all()
+            df[col] = values.astype('int32') if is_integer else values.astype('float32')
+    return df
+
+def frame_memory_mb(*frames):
+    return sum(df.memory_usage(deep=True).sum() for df in frames if df is not None) / 1024 ** 2
+
+# --- KONEKSI KE GOOGLE SHEETS ---
+GSPREAD_SCOPES = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
+STORE_FILE_CODES = {'amb': 'AMB', 'bsb': 'BSB', 'mcd': 'MCD'}
+# Nama frame source -> key file di Drive (kedua kamus ada di satu spreadsheet)
+SOURCE_FILE_KEYS = {
+    'store_kamus': 'kamus',
+    'sku_kamus': 'kamus',
+    'export': 'export',
+    **{key: key for key in STORE_FILE_CODES},
+}
+
+def authorize_gspread(service_account_info):
+    credentials = Credentials.from_service_account_info(service_account_info, scopes=GSPREAD_SCOPES)
+    return gspread.authorize(credentials)
+
+def find_source_files(gc):
+    """Cari file sumber dan modifiedTime-nya dengan satu call list_spreadsheet_files().
+
+    Return tuple (key, file_id, modified_time) supaya bisa jadi cache key / versi data.
+    """
+    # List semua spreadsheet
+    all_files = gc.list_spreadsheet_files()
+    
+    # Cari file berdasarkan pattern
+    source_files = {
+        'kamus': (None, None),
+        'export': (None, None),
+        'amb': (None, None),
+        'bsb': (None, None),
+        'mcd': (None, None)
+    }
+    
+    for f in all_files:
+        name = f['name'].lower()
+        if f['name'] == KAMUS_SPREADSHEET:
+            key = 'kamus'
+        elif 'export_' in name and 'xlsx' not in name:
+            key = 'export'
+        elif 'source_amb' in name:
+            key = 'amb'
+        elif 'source_bsb' in name:
+            key = 'bsb'
+        elif 'source_mcd' in name:
+            key = 'mcd'
+        else:
+            continue
+        source_files[key] = (f['id'], f.get('modifiedTime'))
+    
+    return tuple((key, file_id, modified_time) for key, (file_id, modified_time) in source_files.items())
+
+class SourceFrameCache:
+    """Cache in-memory per source, divalidasi dengan (file_id, modifiedTime).
+
+    Hanya versi terakhir tiap source yang disimpan. Frame dikembalikan sebagai shallow
+    copy supaya penambahan kolom oleh pemanggil tidak mengubah isi cache. Sales export
+    (frame mentah terbesar, semua kolom string) tidak disimpan di sini; versi yang tidak
+    berubah dibaca ulang dari snapshot Parquet.
+    """
+    
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+    
+    def get(self, source, file_id, modified_time):
+        with self._lock:
+            entry = self._entries.get(source)
+        if entry is None or modified_time is None or entry[:2] != (file_id, modified_time):
+            return None
+        return entry[2].copy(deep=False)
+    
+    def put(self, source, file_id, modified_time, frame):
+        with self._lock:
+            self._entries[source] = (file_id, modified_time, frame)
+        return frame.copy(deep=False)
+
+def _read_file_fetcher(reader, file_id, file_key, sources):
+    """Callable yang membaca worksheet semua `sources` dari satu file dengan satu batchGet"""
+    def fetch():
+        resolved_id = file_id or reader.resolve_file_id(KAMUS_SPREADSHEET, file_key)
+        worksheet_indexes = [SOURCE_WORKSHEET_INDEX.get(source, 0) for source in sources]
+        return dict(zip(sources, reader.read_worksheets(resolved_id, worksheet_indexes, file_key)))
+    return fetch
+
+def fetch_source_frames(gc, source_files, max_workers=SHEETS_MAX_WORKERS, snapshot_store=None,
+                        frame_cache=None, notify=log_message, recorder=None, reader=None, file_keys=None):
+    """Ambil frame mentah semua source: cache memory -> snapshot disk -> fetch paralel.
+
+    Fetch berjalan per file lewat `reader` (SheetsReader; default dibuat dari `gc` dengan
+    rate limiter bersama): worksheet dari file yang sama dibaca dalam satu request. Waktu
+    cold load = file paling lambat. `file_keys` membatasi ke sebagian file saja (mis. hanya
+    yang berubah). Return (frames, errors): dict per nama source (lihat SOURCE_FILE_KEYS);
+    source yang file-nya tidak ditemukan tidak ada di keduanya.
+    """
+    snapshot_store = snapshot_store or SnapshotStore()
+    frame_cache = frame_cache or SourceFrameCache()
+    reader = reader or SheetsReader(gc)
+    file_ids = {key: file_id for key, file_id, _ in source_files}
+    modified_times = {key: modified_time for key, _, modified_time in source_files}
+    
+    frames = {}
+    pending = {}
+    snapshot_sources = []
+    for source, file_key in SOURCE_FILE_KEYS.items():
+        file_id = file_ids[file_key]
+        modified_time = modified_times[file_key]
+        if (file_id is None and file_key != 'kamus') or (file_keys is not None and file_key not in file_keys):
+            continue
+        cached_frame = None if source == 'export' else frame_cache.get(source, file_id, modified_time)
+        if cached_frame is not None:
+            frames[source] = cached_frame
+        elif snapshot_store.is_fresh(source, file_id, modified_time):
+            frame = snapshot_store.read(source)
+            frames[source] = frame if source == 'export' else frame_cache.put(source, file_id, modified_time, frame)
+            snapshot_sources.append(source)
+        else:
+            pending.setdefault(file_key, []).append(source)
+    
+    fetchers = {}
+    for file_key, sources in pending.items():
+        if file_key == 'export':
+            # Sales export hanya di-append: sync incremental, bukan re-download penuh
+            fetchers[file_key] = lambda: sync_sales_export(reader, file_ids['export'], snapshot_store, modified_times['export'])
+        else:
+            fetchers[file_key] = _read_file_fetcher(reader, file_ids[file_key], file_key, sources)
+    
+    reads_before = reader.stats()
+    results, file_errors, fetch_timings = fetch_sheets_concurrently(fetchers, max_workers=max_workers)
+    if recorder is not None:
+        for name, secs in sorted(fetch_timings.items()):
+            recorder.add(f"fetch {name}", secs)
+    
+    # Error per file berlaku untuk semua source di file tersebut
+    fetch_errors = {source: error for file_key, error in file_errors.items() for source in pending[file_key]}
+    for file_key, result in results.items():
+        if file_key == 'export':
+            frame, sync_info = result
+            if sync_info['mode'] == 'incremental':
+                notify('caption', f"🔁 Sales sync: +{sync_info['new_rows']:,} baris baru ({sync_info['total_rows']:,} total)")
+            frames['export'] = frame
+            continue
+        for source, values in result.items():
+            frame = snapshot_store.write(
+                source, values_to_frame(values), file_id=file_ids[file_key], modified_time=modified_times[file_key]
+            )
+            frames[source] = frame_cache.put(source, file_ids[file_key], modified_times[file_key], frame)
+    
+    if fetch_timings:
+        timing_text = " | ".join(f"{name}: {secs:.2f}s" for name, secs in sorted(fetch_timings.items()))
+        notify('caption', f"⏱️ Sheets fetch ({max_workers} parallel) - {timing_text}")
+        throttled, backoff_s = 0, 0.0
+        for label, metrics in reader.stats().items():
+            throttled += metrics['throttled'] - reads_before.get(label, {}).get('throttled', 0)
+            backoff_s += metrics['backoff_s'] - reads_before.get(label, {}).get('backoff_s', 0.0)
+        if throttled:
+            notify('notice', f"⏳ Kuota Sheets: {throttled}x HTTP 429, total backoff {backoff_s:.1f}s")
+    if snapshot_sources:
+        notify('caption', f"💾 Dari snapshot lokal (tidak berubah): {', '.join(sorted(snapshot_sources))}")
+    
+    return frames, fetch_errors
+
+def assemble_source_frames(frames, errors=None, notify=log_message, recorder=None):
+    """Validasi kolom kamus, gabungkan stock semua store dan terapkan schema kompak.
+
+    `frames`/`errors` per nama source seperti hasil fetch_source_frames() atau
+    read_local_sources(). Return (df_sales, df_store_kamus, df_sku_kamus, df_stock_total);
+    semuanya None jika kamus tidak bisa dipakai.
+    """
+    errors = errors or {}
+    
+    # Load Kamus Store (Sheet 1) dan SKU Kamus (Sheet 2)
+    try:
+        for key in ('store_kamus', 'sku_kamus'):
+            if key in errors:
+                raise errors[key]
+        
+        # Sheet 1: Store Kamus dengan kolom Store (kolom C)
+        df_store_kamus = frames['store_kamus']
+        
+        # Validasi kolom Store di Sheet 1
+        if 'Store' in df_store_kamus.columns:
+            notify('success', "✅ Kolom 'Store' ditemukan di Sheet 1")
+        else:
+            # Coba cari kolom dengan nama yang mirip
+            store_cols = [col for col in df_store_kamus.columns if 'store' in col.lower() or 'nama' in col.lower()]
+            if store_cols:
+                df_store_kamus = df_store_kamus.rename(columns={store_cols[0]: 'Store'})
+                notify('success', f"✅ Menggunakan kolom '{store_cols[0]}' sebagai Store")
+            elif 'POS' in df_store_kamus.columns:
+                df_store_kamus['Store'] = df_store_kamus['POS']
+                notify('notice', "⚠️ Menggunakan POS sebagai Store name")
+        
+        # Sheet 2: SKU Kamus (SKU dan Kategori)
+        df_sku_kamus = frames['sku_kamus']
+        
+        # Validasi kolom SKU dan SKU_Category
+        if 'SKU' not in df_sku_kamus.columns:
+            sku_cols = [col for col in df_sku_kamus.columns if 'sku' in col.lower()]
+            if sku_cols:
+                df_sku_kamus = df_sku_kamus.rename(columns={sku_cols[0]: 'SKU'})
+            else:
+                notify('error', "❌ Kolom 'SKU' tidak ditemukan di Sheet 2")
+                return None, None, None, None
+        
+        if 'SKU_Category' not in df_sku_kamus.columns:
+            category_cols = [col for col in df_sku_kamus.columns if 'category' in col.lower() or 'kategori' in col.lower()]
+            if category_cols:
+                df_sku_kamus = df_sku_kamus.rename(columns={category_cols[0]: 'SKU_Category'})
+            else:
+                notify('error', "❌ Kolom 'SKU_Category' tidak ditemukan di Sheet 2")
+                return None, None, None, None
+                
+    except Exception as e:
+        notify('error', f"⚠️ Error loading kamus data: {e}")
+        return None, None, None, None
+    
+    # Load Sales Data
+    if 'export' in errors:
+        raise errors['export']
+    if 'export' in frames:
+        df_sales = frames['export']
+        cols_sales = ['Ordernumber', 'Orderdate', 'ItemSKU', 'ItemPrice', 'ItemOrdered']
+        
+        # Validasi kolom sales
+        available_cols = [col for col in cols_sales if col in df_sales.columns]
+        if len(available_cols) < 3:
+            notify('error', "❌ Kolom sales tidak lengkap")
+            df_sales = pd.DataFrame()
+        else:
+            df_sales = df_sales[available_cols]
+    else:
+        notify('error', "❌ File sales (export_) tidak ditemukan!")
+        df_sales = pd.DataFrame()
+    
+    # Load Stock Data
+    stock_dfs = []
+    
+    for key, store_code in STORE_FILE_CODES.items():
+        if key in frames or key in errors:
+            try:
+                if key in errors:
+                    raise errors[key]
+                df = frames[key]
+                if len(df) > 0:
+                    # Standardize column names
+                    col_mapping = {}
+                    for col in df.columns:
+                        col_lower = col.lower()
+                        if 'location' in col_lower or 'store' in col_lower or 'pos' in col_lower:
+                            col_mapping[col] = 'Location Code'
+                        elif 'sku' in col_lower:
+                            col_mapping[col] = 'SKU'
+                        elif 'total' in col_lower or 'stock' in col_lower or 'qty' in col_lower:
+                            col_mapping[col] = 'Total'
+                    
+                    df = df.rename(columns=col_mapping)
+                    
+                    # Pastikan kolom yang dibutuhkan ada
+                    if 'SKU' not in df.columns or 'Total' not in df.columns:
+                        notify('warning', f"⚠️ Kolom SKU atau Total tidak ditemukan di file {store_code}")
+                        continue
+                    
+                    # Jika tidak ada Location Code, tambahkan dari store_code
+                    if 'Location Code' not in df.columns:
+                        df['Location Code'] = store_code
+                    
+                    df['Store_Code'] = store_code
+                    stock_dfs.append(df[['Location Code', 'SKU', 'Total', 'Store_Code']])
+                    
+            except Exception as e:
+                notify('warning', f"⚠️ Gagal load stock data untuk {store_code}: {e}")
+    
+    df_stock_total = pd.concat(stock_dfs, ignore_index=True) if stock_dfs else pd.DataFrame()
+    
+    # Terapkan schema kompak: memperkecil DataSnapshot yang dipakai bersama semua session
+    memory_before = frame_memory_mb(df_sales, df_sku_kamus, df_stock_total)
+    with perf_stage(recorder, "ingestion schema (incl. date parsing)") as stage:
+        df_sales = apply_ingestion_schema(df_sales, INGESTION_SCHEMA['sales'])
+        df_stock_total = apply_ingestion_schema(df_stock_total, INGESTION_SCHEMA['stock'])
+        df_sku_kamus = apply_ingestion_schema(df_sku_kamus, INGESTION_SCHEMA['sku_kamus'])
+        stage['frame'] = [df_sales, df_stock_total, df_sku_kamus]
+    memory_after = frame_memory_mb(df_sales, df_sku_kamus, df_stock_total)
+    notify('caption',
+        f"🧮 Memori data: {memory_before:.1f} MB → {memory_after:.1f} MB "
+        f"(hemat {memory_before - memory_after:.1f} MB)"
+    )
+    
+    return df_sales, df_store_kamus, df_sku_kamus, df_stock_total
+
+def load_source_frames(gc, source_files, max_workers=SHEETS_MAX_WORKERS, snapshot_store=None,
+                       frame_cache=None, notify=log_message, recorder=None, reader=None):
+    """Load semua source dari Google Sheets (lewat cache/snapshot bila tidak berubah).
+
+    Return (df_sales, df_store_kamus, df_sku_kamus, df_stock_total, data_version); semuanya
+    None jika kamus tidak bisa dipakai. `recorder` (PerfRecorder) opsional untuk timing per tahap.
+    """
+    with perf_stage(recorder, "fetch sources") as stage:
+        frames, errors = fetch_source_frames(
+            gc, source_files, max_workers, snapshot_store, frame_cache, notify, recorder, reader
+        )
+        stage['frame'] = list(frames.values())
+    df_sales, df_store_kamus, df_sku_kamus, df_stock_total = assemble_source_frames(frames, errors, notify, recorder)
+    if df_store_kamus is None:
+        return None, None, None, None, None
+    
+    # Versi data = versi tiap source yang berhasil di-load (dipakai sebagai cache key analisis)
+    data_version = (source_files, tuple(sorted(frames)))
+    
+    return df_sales, df_store_kamus, df_sku_kamus, df_stock_total, data_version
+
+def read_local_sources(source_dir):
+    """Baca frame source dari folder lokal: <source>.parquet atau <source>.csv.
+
+    Nama file sama dengan snapshot (store_kamus, sku_kamus, export, amb, bsb, mcd), jadi
+    folder snapshot dashboard bisa langsung dipakai. Source yang tidak ada dilewati.
+    """
+    source_dir = Path(source_dir)
+    frames = {}
+    for source in SOURCE_FILE_KEYS:
+        parquet_path = source_dir / f"{source}.parquet"
+        csv_path = source_dir / f"{source}.csv"
+        if parquet_path.exists():
+            frames[source] = pd.read_parquet(parquet_path)
+        elif csv_path.exists():
+            frames[source] = pd.read_csv(csv_path)
+    return frames
+
+# --- KLASIFIKASI STATUS BERDASARKAN WEEK COVER ---
+# Urutan kategori = urutan prioritas sorting (Critical paling atas)
+STATUS_ORDER = [
+    "🚨 Critical",
+    "⚠️ Need Reorder",
+    "✅ Healthy",
+    "📈 Good Buffer",
+    "🛑 Overstock",
+    "📦 New/Dead Stock"
+]
+STATUS_DTYPE = pd.CategoricalDtype(STATUS_ORDER, ordered=True)
+
+# Batas week cover: (critical, need reorder, healthy/target, good buffer)
+DEFAULT_WEEKCOVER_THRESHOLDS = (2, 4, 8, 12)
+
+def weekcover_thresholds(target_weekcover, critical=2, reorder=4, buffer_margin=4):
+    """Susun threshold (critical, reorder, healthy, buffer) dari target weekcover.
+
+    Target weekcover menjadi batas atas Healthy; Good Buffer sampai target + buffer_margin.
+    Default (target 8) menghasilkan DEFAULT_WEEKCOVER_THRESHOLDS.
+    """
+    reorder = max(reorder, critical)
+    healthy = max(target_weekcover, reorder)
+    return (critical, reorder, healthy, healthy + buffer_margin)
+
+def weekcover_status_codes(total, ams, week_cover, thresholds=DEFAULT_WEEKCOVER_THRESHOLDS):
+    """Kode status (posisi di STATUS_ORDER) secara vectorized dengan np.select.
+
+    Semua input di-broadcast, jadi threshold boleh berupa array (mis. shape (1, n_scenario))
+    untuk mengklasifikasi banyak skenario sekaligus.
+    """
+    critical, reorder, healthy, buffer = thresholds
+    total = np.asarray(total, dtype=float)
+    ams = np.asarray(ams, dtype=float)
+    week_cover = np.asarray(week_cover, dtype=float)
+    
+    conditions = [
+        (total > 0) & (ams == 0),
+        week_cover < critical,
+        week_cover < reorder,
+        week_cover <= healthy,
+        week_cover <= buffer,
+    ]
+    choices = [
+        STATUS_ORDER.index("📦 New/Dead Stock"),
+        STATUS_ORDER.index("🚨 Critical"),
+        STATUS_ORDER.index("⚠️ Need Reorder"),
+        STATUS_ORDER.index("✅ Healthy"),
+        STATUS_ORDER.index("📈 Good Buffer"),
+    ]
+    return np.select(conditions, choices, default=STATUS_ORDER.index("🛑 Overstock"))
+
+def classify_weekcover(total, ams, week_cover, thresholds=DEFAULT_WEEKCOVER_THRESHOLDS):
+    """Klasifikasi status stock secara vectorized (np.select, tanpa apply per baris).
+
+    Stock tanpa sales (AMS = 0) selalu New/Dead Stock; sisanya diklasifikasi berdasarkan
+    week cover: < critical, < reorder, <= healthy, <= buffer, sisanya Overstock.
+    Return Categorical dengan dtype STATUS_DTYPE (ordered), jadi bisa langsung di-sort.
+    """
+    codes = weekcover_status_codes(total, ams, week_cover, thresholds)
+    return pd.Categorical.from_codes(codes, dtype=STATUS_DTYPE)
+
+# --- FUNGSI UNTUK INVENTORY CONTROL TABLE (THRESHOLD WEEK COVER BISA DIATUR) ---
+INVENTORY_METRIC_COLUMNS = [
+    'ideal_stock', 'need_replenishment', 'over_stock', 'non_moving', 'count_of_sku',
+    'qty_stock', 'avg_sales', 'replenishment_qty_suggest', 'weekcover'
+]
+
+def summarize_inventory_control(analysis_df, thresholds=DEFAULT_WEEKCOVER_THRESHOLDS):
+    """Hitung raw_metrics Inventory Control untuk semua store dalam satu groupby.
+
+    Return DataFrame ber-index Store_Name (urut nama) dengan kolom INVENTORY_METRIC_COLUMNS.
+    """
+    if analysis_df.empty:
+        return pd.DataFrame(columns=INVENTORY_METRIC_COLUMNS)
+    
+    # Hitung Week Cover dengan benar (Month Cover * 4.33)
+    week_cover = analysis_df['Month_Cover'] * 4.33
+    week_status = pd.Series(
+        classify_weekcover(analysis_df['Total'], analysis_df['AMS'], week_cover, thresholds),
+        index=analysis_df.index
+    )
+    
+    # Mapping status ke kategori control berdasarkan WEEK COVER
+    need_replenishment = week_status.isin(['🚨 Critical', '⚠️ Need Reorder'])
+    
+    # Replenishment Quantity Suggested untuk mencapai target (healthy threshold, 4 minggu = 1 bulan AMS)
+    target_months = thresholds[2] / 4
+    replenishment_suggest = np.where(
+        week_cover < thresholds[2],
+        (analysis_df['AMS'] * target_months - analysis_df['Total']).clip(lower=0),
+        (analysis_df['AMS'] * 0.5).clip(lower=0)
+    )
+    
+    per_sku = pd.DataFrame({
+        'Store_Name': analysis_df['Store_Name'],
+        'ideal_stock': week_status.isin(['✅ Healthy', '📈 Good Buffer']),
+        'need_replenishment': need_replenishment,
+        'over_stock': week_status == '🛑 Overstock',
+        'non_moving': week_status == '📦 New/Dead Stock',
+        'count_of_sku': 1,
+        'qty_stock': analysis_df['Total'],
+        'avg_sales': analysis_df['AMS'],
+        'replenishment_qty_suggest': np.where(need_replenishment, replenishment_suggest, 0),
+        'weekcover': week_cover,
+    })
+    
+    metrics = per_sku.groupby('Store_Name', observed=True, sort=False).agg({
+        'ideal_stock': 'sum',
+        'need_replenishment': 'sum',
+        'over_stock': 'sum',
+        'non_moving': 'sum',
+        'count_of_sku': 'sum',
+        'qty_stock': 'sum',
+        'avg_sales': 'sum',
+        'replenishment_qty_suggest': 'sum',
+        'weekcover': 'median',
+    })
+    int_columns = INVENTORY_METRIC_COLUMNS[:-1]
+    metrics[int_columns] = metrics[int_columns].astype('int64')
+    metrics.index = metrics.index.astype(str)
+    return metrics.sort_index()
+
+def build_inventory_control_table(store_display_name, raw_metrics):
+    """Susun tabel Control dan Grand Total dari raw_metrics satu store"""
+    count_of_sku = raw_metrics['count_of_sku']
+    qty_stock = raw_metrics['qty_stock']
+    avg_sales = raw_metrics['avg_sales']
+    replenishment_qty_suggest = raw_metrics['replenishment_qty_suggest']
+    avg_weekcover = raw_metrics['weekcover']
+    
+    # Buat dictionary untuk tabel
+    control_data = {
+        'Metric': ['Ideal Stock', 'Need Replenishment', 'Over Stock', 'Non Moving Stock', 
+                   'Count of SKU', 'Qty Stock', 'AVG Sales', 'Replenishment Qty Suggest', 'Weekcover'],
+        'Value': [
+            raw_metrics['ideal_stock'],
+            raw_metrics['need_replenishment'],
+            raw_metrics['over_stock'],
+            raw_metrics['non_moving'],
+            count_of_sku,
+            f"{qty_stock:,}",
+            f"{avg_sales:,}",
+            f"{replenishment_qty_suggest:,}",
+            f"{avg_weekcover:.1f}"
+        ]
+    }
+    
+    # Buat DataFrame untuk Control section
+    control_df = pd.DataFrame(control_data)
+    
+    # Buat Grand Total section
+    grand_total_data = {
+        'Metric': ['Count of SKU', 'Qty Stock', 'AVG Sales', 'Replenishment Qty Suggest', 'Weekcover'],
+        'Value': [
+            f"**{count_of_sku}**",
+            f"**{qty_stock:,}**",
+            f"**{avg_sales:,}**",
+            f"**{replenishment_qty_suggest:,}**",
+            f"**{avg_weekcover:.1f}**"
+        ]
+    }
+    
+    grand_total_df = pd.DataFrame(grand_total_data)
+    
+    return {
+        'store_name': store_display_name,
+        'control_df': control_df,
+        'grand_total_df': grand_total_df,
+        'raw_metrics': raw_metrics
+    }
+
+def create_inventory_control_table(analysis_df, sales_data, store_name, store_display_name=None,
+                                   thresholds=DEFAULT_WEEKCOVER_THRESHOLDS):
+    """Membuat tabel Inventory Control untuk satu store dengan `thresholds` week cover.
+
+    Untuk banyak store sekaligus, pakai summarize_inventory_control() (satu groupby).
+    """
+    
+    if store_display_name is None:
+        store_display_name = store_name
+    
+    # Filter data untuk store tertentu
+    store_data = analysis_df[analysis_df['Store_Name'] == store_name].copy()
+    
+    if store_data.empty:
+        return None
+    
+    store_data['Week_Cover'] = store_data['Month_Cover'] * 4.33
+    store_data['Week_Status'] = classify_weekcover(
+        store_data['Total'], store_data['AMS'], store_data['Week_Cover'], thresholds
+    )
+    
+    raw_metrics = summarize_inventory_control(store_data, thresholds).to_dict('records')[0]
+    
+    table_data = build_inventory_control_table(store_display_name, raw_metrics)
+    table_data['week_status_data'] = store_data
+    return table_data
+
+# --- WHAT-IF SCENARIO: BANYAK TARGET WEEKCOVER SEKALIGUS ---
+SCENARIO_VALUE_COLUMNS = ['Replenish_Qty', 'Replenish_Value', 'SKU_Below_Target']
+
+def simulate_weekcover_scenarios(analysis_df, targets, critical=2, reorder=4, buffer_margin=4):
+    """Replenishment dan distribusi status per store untuk setiap target weekcover.
+
+    Dihitung sebagai matriks (baris SKU-store x skenario) dengan broadcasting NumPy lalu
+    diagregasi per store dengan bincount, tanpa loop per target. Replenishment mengikuti
+    summarize_inventory_control(): AMS * healthy/4 - Total hanya untuk SKU Critical /
+    Need Reorder di threshold skenario, jadi di target aktif angkanya sama dengan tabel Control.
+    Return long DataFrame: Store_Name, Target_Weekcover, SCENARIO_VALUE_COLUMNS dan satu
+    kolom jumlah SKU per status.
+    """
+    targets = np.unique(np.asarray(targets, dtype=float))
+    columns = ['Store_Name', 'Target_Weekcover'] + SCENARIO_VALUE_COLUMNS + STATUS_ORDER
+    if analysis_df.empty or targets.size == 0:
+        return pd.DataFrame(columns=columns)
+    
+    store_codes, stores = pd.factorize(analysis_df['Store_Name'].astype(str), sort=True)
+    n_stores, n_targets = len(stores), targets.size
+    total = analysis_df['Total'].to_numpy(dtype=float)[:, None]
+    ams = analysis_df['AMS'].to_numpy(dtype=float)[:, None]
+    week_cover = analysis_df['Week_Cover'].to_numpy(dtype=float)[:, None]
+    price = np.nan_to_num(analysis_df['Avg_Price'].to_numpy(dtype=float))[:, None]
+    
+    # (n_rows, n_targets)
+    scenario_targets = targets[None, :]
+    below_target = week_cover < scenario_targets
+    healthy = np.maximum(scenario_targets, max(reorder, critical))
+    status_codes = weekcover_status_codes(
+        total, ams, week_cover,
+        (critical, max(reorder, critical), healthy, healthy + buffer_margin)
+    )
+    # Sama dengan need_replenishment di Inventory Control: status Critical / Need Reorder
+    need_replenishment = status_codes < STATUS_ORDER.index("✅ Healthy")
+    replenish_qty = np.where(need_replenishment, np.clip(ams * healthy / 4 - total, 0, None), 0.0)
+    
+    # Satu bucket per (store, target) -> bincount sekali untuk setiap metrik
+    cell = store_codes[:, None] * n_targets + np.arange(n_targets)[None, :]
+    n_cells = n_stores * n_targets
+    flat_cell = cell.ravel()
+    result = pd.DataFrame({
+        'Store_Name': np.repeat(stores.to_numpy(), n_targets),
+        'Target_Weekcover': np.tile(targets, n_stores),
+        'Replenish_Qty': np.bincount(flat_cell, weights=replenish_qty.ravel(), minlength=n_cells).round().astype('int64'),
+        'Replenish_Value': np.bincount(flat_cell, weights=(replenish_qty * price).ravel(), minlength=n_cells),
+        'SKU_Below_Target': np.bincount(flat_cell, weights=below_target.ravel(), minlength=n_cells).astype('int64'),
+    })
+    status_counts = np.bincount(
+        flat_cell * len(STATUS_ORDER) + status_codes.ravel(), minlength=n_cells * len(STATUS_ORDER)
+    ).reshape(n_cells, len(STATUS_ORDER))
+    result[STATUS_ORDER] = status_counts
+    return result[columns]
+
+def summarize_scenarios(scenarios):
+    """Total semua store per target weekcover (untuk tabel perbandingan dan kurva)"""
+    if scenarios.empty:
+        return scenarios.drop(columns='Store_Name')
+    
+    return scenarios.groupby('Target_Weekcover', as_index=False)[SCENARIO_VALUE_COLUMNS + STATUS_ORDER].sum()
+
+# --- PRIORITY ACTIONS (CRITICAL & NEED REORDER) ---
+PRIORITY_STATUSES = ["🚨 Critical", "⚠️ Need Reorder"]
+PRIORITY_DISPLAY_COLUMNS = ['SKU', 'SKU_Category', 'Total', 'AMS', 'Week_Cover', 'Recommended_Order', 'Status']
+
+def build_priority_actions(analysis_df, target_weekcover):
+    """Rekomendasi order untuk SKU Critical/Need Reorder, numerik dari awal sampai akhir.
+
+    Return (items, summary): items per SKU-store (urut store lalu Week_Cover) dan summary
+    per store (SKU_Count, Recommended_Order, Median_Week_Cover) dari satu groupby.
+    Urutan store mengikuti kemunculan pertama di analysis_df (Critical dulu).
+    """
+    priority_items = analysis_df[analysis_df['Status'].isin(PRIORITY_STATUSES)]
+    if priority_items.empty:
+        return priority_items.reindex(columns=PRIORITY_DISPLAY_COLUMNS + ['Store_Name']), pd.DataFrame(
+            columns=['SKU_Count', 'Recommended_Order', 'Median_Week_Cover']
+        )
+    
+    # Gap untuk mencapai target, minimal order 0.5 minggu
+    week_cover_gap = (target_weekcover - priority_items['Week_Cover']).clip(lower=0.5)
+    recommended_order = (priority_items['AMS'] * (week_cover_gap / 4.33)).clip(lower=1)
+    
+    store_order = pd.Index(priority_items['Store_Name'].astype(str).unique())
+    items = priority_items.assign(
+        Store_Name=priority_items['Store_Name'].astype(str),
+        Recommended_Order=np.floor(recommended_order).astype('int64'),
+        _store_rank=lambda d: store_order.get_indexer(d['Store_Name']),
+    ).sort_values(['_store_rank', 'Week_Cover'], kind='stable').drop(columns='_store_rank')
+    
+    summary = items.groupby('Store_Name', sort=False).agg(
+        SKU_Count=('SKU', 'size'),
+        Recommended_Order=('Recommended_Order', 'sum'),
+        Median_Week_Cover=('Week_Cover', 'median'),
+    )
+    return items, summary
+
+# --- FUNGSI HELPER UNTUK ANALISIS DENGAN FILTER SKU ---
+def normalize_sku_keys(values):
+    """Normalisasi SKU jadi string: strip spasi dan samakan angka (111, "111", 111.0 -> "111")"""
+    keys = pd.Series(values).astype(str).str.strip()
+    return keys.str.replace(r'^(\d+)\.0+$', r'\1', regex=True)
+
+class SkuIndex:
+    """Index SKU Kamus yang dibangun sekali per load kamus.
+
+    Menyimpan key SKU yang sudah dinormalisasi beserta kode kategori, sehingga filter
+    dan penambahan SKU_Category bisa dilakukan dalam satu pass lewat integer codes.
+    Jika SKU muncul lebih dari sekali di kamus, kategori baris terakhir yang dipakai.
+    """
+    
+    def __init__(self, sku_kamus):
+        lookup = pd.DataFrame({
+            'key': normalize_sku_keys(sku_kamus['SKU']).to_numpy(),
+            'category': sku_kamus['SKU_Category'].to_numpy(),
+        }).drop_duplicates('key', keep='last')
+        
+        self.keys = pd.Index(lookup['key'])
+        categories = pd.Categorical(lookup['category'])
+        self.categories = categories.categories
+        self.category_codes = categories.codes
+    
+    @property
+    def empty(self):
+        return len(self.keys) == 0
+    
+    def join(self, df, sku_col):
+        """Filter `df` ke SKU yang ada di kamus dan tambahkan kolom SKU_Category.
+
+        Kolom SKU hasilnya ikut dinormalisasi, jadi join antar frame (sales vs stock)
+        tidak gagal diam-diam karena SKU numeric vs string.
+        """
+        # Normalisasi hanya untuk nilai unik: SKU di sales berulang sangat banyak
+        value_codes, uniques = pd.factorize(df[sku_col], use_na_sentinel=False)
+        unique_keys = normalize_sku_keys(uniques).to_numpy()
+        unique_positions = self.keys.get_indexer(unique_keys)
+        
+        positions = unique_positions[value_codes]
+        mask = positions >= 0
+        
+        df_filtered = df[mask].copy()
+        df_filtered[sku_col] = unique_keys[value_codes[mask]]
+        df_filtered['SKU_Category'] = pd.Categorical.from_codes(
+            self.category_codes[positions[mask]], categories=self.categories
+        )
+        return df_filtered
+
+def filter_by_sku_kamus(df, sku_kamus):
+    """Filter dataframe hanya untuk SKU yang ada di SKU Kamus (DataFrame kamus atau SkuIndex)"""
+    if sku_kamus.empty:
+        return df
+    
+    # Kamus mentah (mis. dari file lokal) diindeks dulu; SkuIndex dari DataSnapshot dipakai ulang
+    sku_index = SkuIndex(sku_kamus) if isinstance(sku_kamus, pd.DataFrame) else sku_kamus
+    
+    if 'ItemSKU' in df.columns:
+        # Untuk sales data
+        return sku_index.join(df, 'ItemSKU')
+    elif 'SKU' in df.columns:
+        # Untuk stock data
+        return sku_index.join(df, 'SKU')
+    
+    return df
+
+def build_sales_cube(sales_data, since=None):
+    """Agregasi sales per (Store_Name, SKU) untuk perhitungan AMS per store.
+
+    `sales_data` harus sudah lewat filter_by_sku_kamus (SKU ternormalisasi). Menyimpan
+    Qty_3Mo serta jumlah harga dan jumlah baris (untuk Avg_Price), jadi cube bisa di-slice
+    untuk subset store mana pun tanpa groupby ulang.
+    """
+    if since is not None:
+        sales_data = sales_data[sales_data['Orderdate'] >= since]
+    
+    cube = sales_data.groupby(['Store_Name', 'ItemSKU'], observed=True).agg(
+        Qty_3Mo=('ItemOrdered', 'sum'),
+        Price_Sum=('ItemPrice', 'sum'),
+        Price_Lines=('ItemPrice', 'count')
+    )
+    cube.index = cube.index.set_names(['Store_Name', 'SKU'])
+    return cube
+
+# --- DAILY SALES CUBE (TANGGAL x STORE x SKU) ---
+class DailySalesCube:
+    """Rollup sales harian per (store, SKU): Units, Revenue, Price_Sum, Lines, Orders.
+
+    Baris diurutkan per grup (store, SKU) lalu tanggal, dengan cumulative sum per kolom.
+    Total untuk window tanggal apa pun dihitung lewat searchsorted + selisih cumsum,
+    jadi biayanya tergantung jumlah hari x SKU, bukan jumlah baris order.
+    """
+    
+    VALUE_COLUMNS = ['Units', 'Revenue', 'Price_Sum', 'Lines', 'Orders']
+    
+    def __init__(self, frame):
+        frame = frame.sort_values(['Store_Name', 'SKU', 'Date'], kind='stable').reset_index(drop=True)
+        self.frame = frame
+        
+        group_codes, groups = pd.MultiIndex.from_frame(frame[['Store_Name', 'SKU']].astype(object)).factorize()
+        self.groups = groups
+        self.group_codes = group_codes
+        
+        days = frame['Date'].to_numpy(dtype='datetime64[D]').astype(np.int64)
+        self.day_min = int(days.min()) if len(days) else 0
+        self.day_max = int(days.max()) if len(days) else 0
+        self._span = self.day_max - self.day_min + 1
+        self._keys = group_codes.astype(np.int64) * self._span + (days - self.day_min)
+        
+        # Cumsum dengan 0 di depan: total baris [lo, hi) = cum[hi] - cum[lo]
+        self._cumsums = {
+            col: np.concatenate([[0.0], np.cumsum(frame[col].to_numpy(dtype=float))])
+            for col in self.VALUE_COLUMNS
+        }
+    
+    @classmethod
+    def from_sales(cls, df_sales_mapped):
+        """Bangun cube dari sales line-item (Orderdate sudah datetime, Store_Name sudah di-map)"""
+        sku_codes, sku_uniques = pd.factorize(df_sales_mapped['ItemSKU'], use_na_sentinel=False)
+        lines = pd.DataFrame({
+            'Date': df_sales_mapped['Orderdate'].dt.normalize().to_numpy(),
+            'Store_Name': df_sales_mapped['Store_Name'].astype(object).to_numpy(),
+            'SKU': normalize_sku_keys(sku_uniques).to_numpy()[sku_codes],
+            'Units': df_sales_mapped['ItemOrdered'].to_numpy(dtype=float),
+            'Revenue': (df_sales_mapped['ItemPrice'] * df_sales_mapped['ItemOrdered']).to_numpy(dtype=float),
+            'Price_Sum': df_sales_mapped['ItemPrice'].to_numpy(dtype=float),
+            'Ordernumber': df_sales_mapped['Ordernumber'].to_numpy(),
+        })
+        frame = lines.groupby(['Date', 'Store_Name', 'SKU'], dropna=False).agg(
+            Units=('Units', 'sum'),
+            Revenue=('Revenue', 'sum'),
+            Price_Sum=('Price_Sum', 'sum'),
+            Lines=('Price_Sum', 'count'),
+            Orders=('Ordernumber', 'nunique')
+        ).reset_index()
+        return cls(frame)
+    
+    def window_sums(self, start=None, end=None):
+        """Total per (Store_Name, SKU) untuk tanggal start..end (inklusif, None = tanpa batas).
+
+        Hanya grup yang punya sales di window yang dikembalikan.
+        """
+        if not len(self.frame):
+            return pd.DataFrame(columns=['Store_Name', 'SKU'] + self.VALUE_COLUMNS)
+        
+        d0 = self.day_min if start is None else int(np.datetime64(pd.Timestamp(start).date(), 'D').astype(np.int64))
+        d1 = self.day_max if end is None else int(np.datetime64(pd.Timestamp(end).date(), 'D').astype(np.int64))
+        d0 = min(max(d0, self.day_min), self.day_max + 1) - self.day_min
+        d1 = max(min(d1, self.day_max), self.day_min - 1) - self.day_min
+        
+        group_ids = np.arange(len(self.groups), dtype=np.int64)
+        lo = np.searchsorted(self._keys, group_ids * self._span + d0, side='left')
+        hi = np.searchsorted(self._keys, group_ids * self._span + d1, side='right')
+        
+        result = pd.DataFrame({
+            'Store_Name': self.groups.get_level_values(0),
+            'SKU': self.groups.get_level_values(1),
+            **{col: self._cumsums[col][hi] - self._cumsums[col][lo] for col in self.VALUE_COLUMNS}
+        })
+        return result[hi > lo].reset_index(drop=True)
+    
+    def period_totals(self, freq='M', stores=None, by=None, sku_index=None):
+        """Units & Revenue per periode ('D', 'W', 'M') untuk store terpilih.
+
+        `by` bisa None, 'Store_Name' atau 'SKU_Category' (butuh `sku_index`); semuanya
+        dihitung dengan satu groupby di atas baris cube, tanpa pass tambahan per grup.
+        """
+        frame = self.frame
+        if stores is not None:
+            frame = frame[frame['Store_Name'].isin(stores)]
+        
+        keys = [frame['Date'].dt.to_period(freq).dt.start_time.rename('Period')]
+        if by == 'SKU_Category':
+            positions = sku_index.keys.get_indexer(frame['SKU'])
+            codes = np.where(positions >= 0, sku_index.category_codes[positions], -1)
+            categories = pd.Categorical.from_codes(codes, categories=sku_index.categories)
+            keys.append(pd.Series(categories, index=frame.index, name='SKU_Category')
+                        .cat.add_categories(['(Tanpa kategori)']).fillna('(Tanpa kategori)'))
+        elif by is not None:
+            keys.append(frame[by])
+        
+        totals = frame.groupby(keys, observed=True)[['Units', 'Revenue']].sum()
+        return totals.reset_index()
+
+def daily_cube_to_sales_cube(daily_cube, sku_index, since=None):
+    """Ambil window AMS dari DailySalesCube dalam format build_sales_cube (index Store_Name, SKU)"""
+    window = daily_cube.window_sums(start=since)
+    window = window[window['SKU'].isin(sku_index.keys) & window['Store_Name'].notna()]
+    cube = window.rename(columns={'Units': 'Qty_3Mo', 'Lines': 'Price_Lines'})
+    return cube.set_index(['Store_Name', 'SKU'])[['Qty_3Mo', 'Price_Sum', 'Price_Lines']]
+
+def calculate_stock_health(df_stock, df_sales_mapped, sku_kamus, store_name=None,
+                           thresholds=DEFAULT_WEEKCOVER_THRESHOLDS, sales_cube=None):
+    """Hitung health metrics untuk stock (hanya SKU yang ada di kamus).
+
+    AMS dan Month_Cover dihitung per (store, SKU). `sales_cube` (hasil build_sales_cube)
+    bisa dioper supaya agregasi sales tidak dihitung ulang.
+    """
+    
+    # Filter hanya SKU yang ada di kamus
+    df_stock_filtered = filter_by_sku_kamus(df_stock, sku_kamus)
+    
+    if store_name:
+        stock_data = df_stock_filtered[df_stock_filtered['Store_Name'] == store_name].copy()
+    else:
+        stock_data = df_stock_filtered.copy()
+    
+    if stock_data.empty:
+        return pd.DataFrame()
+    
+    # Hitung sales 3 bulan terakhir per store & SKU
+    if sales_cube is None:
+        current_date = datetime.now()
+        start_date_3mo = current_date - timedelta(days=90)
+        
+        sales_data = filter_by_sku_kamus(df_sales_mapped, sku_kamus)
+        if store_name:
+            sales_data = sales_data[sales_data['Store_Name'] == store_name]
+        sales_cube = build_sales_cube(sales_data, since=start_date_3mo)
+    elif store_name:
+        sales_cube = sales_cube[sales_cube.index.get_level_values('Store_Name') == store_name]
+    
+    # Gabungkan dengan stock
+    analysis_df = stock_data.groupby(['SKU', 'Store_Name', 'SKU_Category'], observed=True).agg({'Total': 'sum'}).reset_index()
+    
+    if not sales_cube.empty:
+        store_sku_sales = sales_cube.reset_index()
+        store_sku_sales['Store_Name'] = store_sku_sales['Store_Name'].astype(str)
+        store_sku_sales['Avg_Price'] = store_sku_sales['Price_Sum'] / store_sku_sales['Price_Lines']
+        
+        # Harga rata-rata SKU dari semua store, untuk store yang belum menjual SKU tersebut
+        sku_prices = sales_cube.groupby(level='SKU')[['Price_Sum', 'Price_Lines']].sum()
+        sku_avg_price = sku_prices['Price_Sum'] / sku_prices['Price_Lines']
+        
+        analysis_df['Store_Name'] = analysis_df['Store_Name'].astype(str)
+        analysis_df = pd.merge(
+            analysis_df, store_sku_sales[['Store_Name', 'SKU', 'Qty_3Mo', 'Avg_Price']],
+            on=['Store_Name', 'SKU'], how='left'
+        )
+        analysis_df['Avg_Price'] = analysis_df['Avg_Price'].fillna(analysis_df['SKU'].map(sku_avg_price))
+        analysis_df['AMS'] = analysis_df['Qty_3Mo'] / 3
+    else:
+        analysis_df['Qty_3Mo'] = 0
+        analysis_df['Avg_Price'] = analysis_df['Total'].median()
+        analysis_df['AMS'] = 0
+    
+    # Fill NaN values
+    analysis_df['Qty_3Mo'] = analysis_df['Qty_3Mo'].fillna(0)
+    analysis_df['AMS'] = analysis_df['AMS'].fillna(0)
+    analysis_df['Avg_Price'] = analysis_df['Avg_Price'].fillna(analysis_df['Avg_Price'].median() if not analysis_df['Avg_Price'].isna().all() else 0)
+    
+    # Hitung Month Cover
+    analysis_df['Month_Cover'] = np.where(
+        analysis_df['AMS'] > 0,
+        analysis_df['Total'] / analysis_df['AMS'],
+        999
+    )
+    
+    # Hitung Week Cover (Month Cover * 4.33)
+    analysis_df['Week_Cover'] = analysis_df['Month_Cover'] * 4.33
+    
+    # Hitung nilai stock
+    analysis_df['Stock_Value'] = analysis_df['Total'] * analysis_df['Avg_Price']
+    
+    # Klasifikasi Status berdasarkan WEEK COVER (threshold dari parameter `thresholds`)
+    # Status berupa ordered Categorical, jadi sorting langsung mengikuti urutan prioritas
+    analysis_df['Status'] = classify_weekcover(
+        analysis_df['Total'], analysis_df['AMS'], analysis_df['Week_Cover'], thresholds
+    )
+    
+    return analysis_df.sort_values('Status', kind='stable')
+
+# --- PIPELINE ANALISIS (DIPAKAI DASHBOARD & CLI) ---
+ANALYSIS_CACHE_SIZE = 32  # Jumlah hasil analisis (per versi data + filter) yang disimpan
+
+class AnalysisCache:
+    """LRU cache untuk hasil analisis, di-key dengan versi data + filter.
+
+    Nilai yang disimpan dipakai bersama oleh semua session, jadi pemanggil tidak boleh
+    mengubah isi frame yang dikembalikan secara in-place. `stage` (opsional, mis. stage
+    PerfRecorder) diisi `cached` = True/False sesuai hit/miss.
+    """
+    
+    def __init__(self, max_entries=ANALYSIS_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = CacheCounters()
+    
+    def get_or_compute(self, key, compute, stage=None):
+        # Counter per jenis hasil (elemen pertama key), mis. 'full_analysis'
+        kind = key[0] if isinstance(key, tuple) else key
+        self.counters.call(kind)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                if stage is not None:
+                    stage['cached'] = True
+                return self._entries[key]
+        
+        self.counters.miss(kind)
+        if stage is not None:
+            stage['cached'] = False
+        value = compute()
+        
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+def prepare_sales_stock(df_sales, df_store_kamus, df_stock):
+    """Mapping POS/Location Code ke nama store (Orderdate sudah datetime64 dari ingestion).
+
+    Return (df_sales_mapped, df_stock) baru; frame input tidak diubah.
+    """
+    df_sales = df_sales.dropna(subset=['Orderdate'])
+    df_stock = df_stock.copy()
+    
+    # Mapping store code dengan nama store dari kolom Store di Sheet 1
+    df_sales['POS_Code'] = df_sales['Ordernumber'].astype(str).str[:4]
+    
+    # Buat mapping dari POS ke Store Name dari df_store_kamus
+    # (kolom category di-cast ke object dulu supaya map/isi nilai baru tidak dibatasi kategori)
+    if 'Store' in df_store_kamus.columns and 'POS' in df_store_kamus.columns:
+        pos_to_store_mapping = df_store_kamus.set_index('POS')['Store'].to_dict()
+        
+        # Apply mapping ke sales data
+        df_sales_mapped = df_sales.copy()
+        df_sales_mapped['Store_Name'] = df_sales_mapped['POS_Code'].map(pos_to_store_mapping)
+        
+        # Apply mapping ke stock data
+        if 'Location Code' in df_stock.columns:
+            df_stock['Store_Name'] = df_stock['Location Code'].astype(object).map(pos_to_store_mapping)
+            
+            # Jika tidak ada mapping, gunakan Store_Code dengan mapping custom
+            store_code_mapping = {'AMB': 'AEON Mall BSD', 'BSB': 'Botani Square Bogor', 'MCD': 'Margo City Depok'}
+            missing_mask = df_stock['Store_Name'].isna()
+            df_stock.loc[missing_mask, 'Store_Name'] = df_stock.loc[missing_mask, 'Store_Code'].astype(object).map(store_code_mapping)
+            
+    else:
+        # Fallback: gunakan kolom yang ada
+        df_sales_mapped = pd.merge(df_sales, df_store_kamus, left_on='POS_Code', right_on='POS', how='left')
+        df_stock['Store_Name'] = df_stock['Store_Code'].astype(object)
+    
+    # Kolom turunan bercardinality rendah disimpan sebagai category
+    df_sales_mapped['POS_Code'] = df_sales_mapped['POS_Code'].astype('category')
+    if 'Store_Name' in df_sales_mapped.columns:
+        df_sales_mapped['Store_Name'] = df_sales_mapped['Store_Name'].astype('category')
+    df_stock['Store_Name'] = df_stock['Store_Name'].astype('category')
+    
+    return df_sales_mapped, df_stock
+
+class DataSnapshot:
+    """Satu versi data source, read-only dan dipakai bersama semua session.
+
+    Kolom turunan (POS_Code, Store_Name) dan SkuIndex dihitung sekali saat build; frame
+    sales mentah tidak disimpan di snapshot maupun SourceFrameCache. Frame dikembalikan
+    sebagai shallow copy: tanpa menyalin data (Copy-on-Write pandas), tapi perubahan di
+    sisi pemanggil tidak mengubah snapshot.
+    """
+    
+    def __init__(self, data_version, frames, sku_index, loaded_at=None, messages=()):
+        object.__setattr__(self, 'data_version', data_version)
+        object.__setattr__(self, 'sku_index', sku_index)
+        object.__setattr__(self, 'loaded_at', loaded_at or datetime.now())
+        # Pesan loading (level, message) untuk ditampilkan ulang di setiap rerun
+        object.__setattr__(self, 'messages', tuple(messages))
+        object.__setattr__(self, '_frames', dict(frames))
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("DataSnapshot bersifat read-only")
+    
+    @classmethod
+    def build(cls, df_sales, df_store_kamus, df_sku_kamus, df_stock, data_version, messages=()):
+        df_sales_mapped, df_stock = prepare_sales_stock(df_sales, df_store_kamus, df_stock)
+        frames = {
+            'sales_mapped': df_sales_mapped,
+            'store_kamus': df_store_kamus,
+            'sku_kamus': df_sku_kamus,
+            'stock': df_stock,
+        }
+        return cls(data_version, frames, SkuIndex(df_sku_kamus), messages=messages)
+    
+    @classmethod
+    def load(cls, gc, source_files, max_workers=SHEETS_MAX_WORKERS, snapshot_store=None,
+             frame_cache=None, notify=log_message, recorder=None, reader=None):
+        """Load source dari Google Sheets lalu build; None jika source tidak bisa dipakai"""
+        messages = []
+        
+        def record(level, message):
+            messages.append((level, message))
+            notify(level, message)
+        
+        df_sales, df_store_kamus, df_sku_kamus, df_stock, data_version = load_source_frames(
+            gc, source_files, max_workers, snapshot_store, frame_cache, record, recorder, reader
+        )
+        if df_sales is None or df_stock is None or df_sku_kamus is None:
+            return None
+        with perf_stage(recorder, "build snapshot (POS mapping + SKU index)") as stage:
+            snapshot = cls.build(df_sales, df_store_kamus, df_sku_kamus, df_stock, data_version, messages)
+            stage['rows'] = len(df_sales)
+        return snapshot
+    
+    def data_as_of(self):
+        """modifiedTime (Drive) per source yang ter-load"""
+        source_files, loaded_sources = self.data_version
+        modified_times = {key: modified_time for key, _, modified_time in source_files}
+        return {source: modified_times.get(SOURCE_FILE_KEYS[source]) for source in loaded_sources}
+    
+    def missing_sources(self):
+        """Source yang file-nya ada di Drive tapi gagal di-load ke snapshot ini"""
+        source_files, loaded_sources = self.data_version
+        found = {key for key, file_id, _ in source_files if file_id is not None}
+        expected = {source for source, file_key in SOURCE_FILE_KEYS.items() if file_key in found}
+        return sorted(expected - set(loaded_sources))
+    
+    def frame(self, name):
+        return self._frames[name].copy(deep=False)
+    
+    @property
+    def sales_mapped(self):
+        return self.frame('sales_mapped')
+    
+    @property
+    def store_kamus(self):
+        return self.frame('store_kamus')
+    
+    @property
+    def sku_kamus(self):
+        return self.frame('sku_kamus')
+    
+    @property
+    def stock(self):
+        return self.frame('stock')
+
+def load_daily_sales_cube(df_sales_mapped, source_files=None, snapshot_store=None):
+    """DailySalesCube dari snapshot disk jika export & kamus tidak berubah.
+
+    Tanpa `source_files` (mis. data dari file lokal) cube selalu dibangun ulang dan tidak
+    disimpan.
+    """
+    if source_files is None:
+        return DailySalesCube.from_sales(df_sales_mapped)
+    
+    cube_version = json.dumps([list(item) for item in source_files if item[0] in ('kamus', 'export')])
+    snapshot_store = snapshot_store or SnapshotStore()
+    if snapshot_store.is_fresh('daily_sales_cube', 'derived', cube_version):
+        return DailySalesCube(snapshot_store.read('daily_sales_cube'))
+    cube = DailySalesCube.from_sales(df_sales_mapped)
+    snapshot_store.write('daily_sales_cube', cube.frame, file_id='derived', modified_time=cube_version)
+    return cube
+
+def run_stock_health(df_stock, df_sales_mapped, sku_index, daily_cube, now=None):
+    """Analisis stock health semua store & kategori dengan window AMS 90 hari dari daily cube"""
+    now = now or datetime.now()
+    # Order dengan Orderdate >= (sekarang - 90 hari); Orderdate tanpa jam, jadi dibulatkan ke atas
+    start_date_3mo = pd.Timestamp(now - timedelta(days=90)).ceil('D')
+    sales_cube = daily_cube_to_sales_cube(daily_cube, sku_index, since=start_date_3mo)
+    return calculate_stock_health(df_stock, df_sales_mapped, sku_index, sales_cube=sales_cube)
+
+def recalculate_weekcover_status(analysis_df, thresholds):
+    """What-if: klasifikasi ulang Status untuk threshold lain tanpa menjalankan ulang pipeline.
+
+    Hanya memakai kolom Total, AMS dan Week_Cover yang sudah dihitung, jadi cukup satu
+    pass vectorized + sort.
+    """
+    if analysis_df.empty:
+        return analysis_df
+    
+    status = classify_weekcover(analysis_df['Total'], analysis_df['AMS'], analysis_df['Week_Cover'], thresholds)
+    return analysis_df.assign(Status=status).sort_values('Status', kind='stable')
+
+# --- REFRESH DATA DI BACKGROUND (STALE-WHILE-REVALIDATE) ---
+SNAPSHOT_REFRESH_INTERVAL = 60  # Detik antar pengecekan modifiedTime (1 metadata call ke Drive)
+
+class SnapshotRefresher:
+    """Menyimpan DataSnapshot terkini dan memperbaruinya dari thread background.
+
+    Hanya load pertama (startup) yang berjalan di thread pemanggil. Setelah itu thread
+    daemon mengecek modifiedTime source setiap `interval` detik dan membangun snapshot
+    baru jika ada file yang berubah atau ada source yang gagal di-load. Selama itu snapshot
+    lama tetap dipakai, lalu diganti dalam satu assignment, jadi rerun interaktif tidak
+    pernah menunggu reload.
+
+    Setelah startup hanya file yang berubah (atau source yang belum pernah ter-load) yang
+    di-fetch dulu. File yang gagal (403, 429/5xx setelah retry) tetap memakai frame terakhir
+    yang berhasil dan dicatat di `last_error`; snapshot hanya dibangun ulang jika minimal
+    satu fetch berhasil, jadi file yang gagal terus hanya dicoba ulang tiap interval.
+
+    `warm_up(snapshot)` (opsional) dipanggil sebelum snapshot baru dipasang, mis. untuk
+    mengisi cache analysis, supaya rerun pertama setelah refresh tidak menghitung ulang.
+    """
+    
+    def __init__(self, gc, interval=SNAPSHOT_REFRESH_INTERVAL, max_workers=SHEETS_MAX_WORKERS,
+                 snapshot_store=None, frame_cache=None, reader=None, warm_up=None):
+        self.gc = gc
+        self.warm_up = warm_up
+        self.reader = reader or SheetsReader(gc)
+        self.interval = interval
+        self.max_workers = max_workers
+        self.snapshot_store = snapshot_store
+        self.frame_cache = frame_cache or SourceFrameCache()
+        self.snapshot = None
+        self.source_files = None
+        self.checked_at = None
+        self.last_error = None
+        self.last_messages = ()
+        self.last_load = None  # PerfRecorder load terakhir (panel admin)
+        # call = pengecekan versi source, miss = snapshot dibangun ulang
+        self.counters = CacheCounters()
+        self._refresh_lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        self._thread = None
+    
+    def get(self):
+        """Snapshot terkini (None jika belum pernah berhasil load); memastikan thread jalan"""
+        if self.snapshot is None:
+            self.refresh()
+        self.start()
+        return self.snapshot
+    
+    def refresh(self):
+        """Cek versi source dan bangun snapshot baru bila berubah; return True jika diganti"""
+        with self._refresh_lock:
+            self.counters.call('snapshot')
+            try:
+                # Drive API punya kuota sendiri: retry/backoff saja, tanpa token bucket Sheets
+                source_files = self.reader.call('drive', lambda: find_source_files(self.gc), rate_limited=False)
+                self.checked_at = datetime.now()
+                messages = []
+                
+                def notify(level, message):
+                    messages.append((level, message))
+                    log_message(level, message)
+                
+                recorder = PerfRecorder("snapshot_refresh")
+                failed = {}
+                if self.snapshot is not None:
+                    file_keys = self._stale_file_keys(source_files)
+                    if not file_keys:
+                        return False
+                    with perf_stage(recorder, "fetch changed sources") as stage:
+                        frames, errors = fetch_source_frames(
+                            self.gc, source_files, self.max_workers, self.snapshot_store, self.frame_cache,
+                            notify, recorder, self.reader, file_keys=file_keys,
+                        )
+                        stage['frame'] = list(frames.values())
+                    failed = {SOURCE_FILE_KEYS[source]: error for source, error in errors.items()}
+                    for file_key, error in sorted(failed.items()):
+                        notify('warning', f"⚠️ Gagal refresh {file_key}, data sebelumnya tetap dipakai: {error}")
+                    if not set(file_keys) - set(failed):
+                        # Tidak ada fetch yang berhasil: tidak perlu build ulang, coba lagi interval berikutnya
+                        self.last_error = self._failed_text(failed)
+                        return False
+                    source_files = self._keep_previous_versions(source_files, failed)
+                
+                self.counters.miss('snapshot')
+                snapshot = DataSnapshot.load(
+                    self.gc, source_files, self.max_workers, self.snapshot_store, self.frame_cache,
+                    notify=notify, recorder=recorder, reader=self.reader,
+                )
+                self.last_messages, self.last_load = tuple(messages), recorder
+                # Hanya tertulis jika JSON log performa diaktifkan (handler dipasang dashboard)
+                perf_logger.info(recorder.to_json(loaded=snapshot is not None, sheets=self.reader.stats()))
+                if snapshot is None:
+                    # Kamus tidak bisa dipakai: snapshot lama dipertahankan, dicoba lagi di interval berikutnya
+                    self.last_error = "Source tidak bisa dipakai (lihat pesan loading)"
+                    return False
+                if self.warm_up is not None:
+                    with perf_stage(recorder, "warm-up analysis cache"):
+                        self.warm_up(snapshot)
+                
+                self.snapshot, self.source_files = snapshot, source_files
+                self.last_error = self._failed_text(failed) if failed else None
+                logger.info("Snapshot diperbarui (%.1fs)", recorder.total_seconds())
+                return True
+            except Exception as e:
+                logger.exception("Refresh snapshot gagal")
+                self.last_error = str(e)
+                return False
+    
+    def _stale_file_keys(self, source_files):
+        """File yang versinya berbeda dari snapshot terkini + file source yang belum ter-load"""
+        previous = {key: (file_id, modified_time) for key, file_id, modified_time in self.source_files}
+        changed = {key for key, file_id, modified_time in source_files if previous.get(key) != (file_id, modified_time)}
+        return changed | {SOURCE_FILE_KEYS[source] for source in self.snapshot.missing_sources()}
+    
+    def _keep_previous_versions(self, source_files, failed):
+        """Versi lama untuk file yang gagal di-fetch, supaya build memakai frame terakhir
+        (masih ada di SourceFrameCache / SnapshotStore) dan file itu dicoba lagi nanti"""
+        previous = {key: (file_id, modified_time) for key, file_id, modified_time in self.source_files}
+        loaded = {SOURCE_FILE_KEYS[source] for source in self.snapshot.data_version[1]}
+        return tuple(
+            (key, *previous[key]) if key in failed and key in loaded else (key, file_id, modified_time)
+            for key, file_id, modified_time in source_files
+        )
+    
+    @staticmethod
+    def _failed_text(failed):
+        return "; ".join(f"{file_key}: {error}" for file_key, error in sorted(failed.items()))
+    
+    def start(self):
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="snapshot-refresher", daemon=True)
+                self._thread.start()
+    
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.refresh()
+
+# --- LAPORAN INVENTORY CONTROL ---
+def store_display_names(df_store_kamus):
+    """Mapping POS -> nama Store dari kamus (kosong jika kolomnya tidak ada)"""
+    if 'Store' in df_store_kamus.columns and 'POS' in df_store_kamus.columns:
+        return df_store_kamus.drop_duplicates('POS').set_index('POS')['Store'].to_dict()
+    return {}
+
+def inventory_control_report(control_metrics, display_names=None, report_date=None):
+    """Satu baris per store dari hasil summarize_inventory_control (format export Inventory Control)"""
+    display_names = display_names or {}
+    report_date = report_date or datetime.now()
+    return pd.DataFrame([
+        {
+            'Date': report_date.strftime('%d/%m/%Y'),
+            'Store': display_names.get(store, store),
+            'Ideal_Stock': raw_metrics['ideal_stock'],
+            'Need_Replenishment': raw_metrics['need_replenishment'],
+            'Over_Stock': raw_metrics['over_stock'],
+            'Non_Moving_Stock': raw_metrics['non_moving'],
+            'Count_of_SKU': raw_metrics['count_of_sku'],
+            'Qty_Stock': raw_metrics['qty_stock'],
+            'AVG_Sales': raw_metrics['avg_sales'],
+            'Replenishment_Qty_Suggest': raw_metrics['replenishment_qty_suggest'],
+            'Weekcover': raw_metrics['weekcover']
+        }
+        for store, raw_metrics in control_metrics.to_dict('index').items()
+    ])
+
+# --- EXPORT (SERIALISASI BERTAHAP) ---
+EXPORT_CHUNK_ROWS = 50_000
+# Format: (ekstensi file, MIME type, codec kompresi pyarrow)
+EXPORT_FORMATS = {
+    'CSV': ('csv', 'text/csv', None),
+    'CSV (gzip)': ('csv.gz', 'application/gzip', 'gzip'),
+    'CSV (zstd)': ('csv.zst', 'application/zstd', 'zstd'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet', None),
+}
+
+def iter_csv_chunks(df, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Encode df ke CSV utf-8 per potongan baris; header hanya di potongan pertama"""
+    if df.empty:
+        yield df.to_csv(index=False).encode('utf-8')
+        return
+    
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows].to_csv(index=False, header=start == 0).encode('utf-8')
+
+def serialize_frame(df, export_format, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Serialisasi df ke bytes sesuai EXPORT_FORMATS.
+
+    CSV ditulis per chunk ke stream (terkompresi gzip/zstd bila dipilih), Parquet ditulis
+    per row group, jadi frame besar tidak pernah di-render sebagai satu string CSV utuh.
+    """
+    _, _, codec = EXPORT_FORMATS[export_format]
+    sink = pa.BufferOutputStream()
+    
+    if export_format == 'Parquet':
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), sink, row_group_size=chunk_rows)
+        return sink.getvalue().to_pybytes()
+    
+    stream = pa.CompressedOutputStream(sink, codec) if codec else sink
+    for chunk in iter_csv_chunks(df, chunk_rows):
+        stream.write(chunk)
+    if codec:
+        # Menutup compressor menulis footer (dan menutup sink)
+        stream.close()
+    return sink.getvalue().to_pybytes()
+
+def export_file_name(prefix, export_format):
+    return f"{prefix}.{EXPORT_FORMATS[export_format][0]}"
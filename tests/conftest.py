@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# engine.py ada di root repo (bukan package terinstall)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
@@ -0,0 +1,144 @@
+"""Client gspread palsu untuk test: Drive listing + http_client (batchGet & metadata).
+
+Bisa menyuntikkan error HTTP (429/400/403/...) dan latency per request, jadi read layer
+(SheetsReader), fetch paralel dan incremental sync bisa diuji tanpa jaringan.
+"""
+import re
+import threading
+import time
+
+import gspread
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.text = ''
+
+    def json(self):
+        return {'error': {'code': self.status_code, 'message': 'fake', 'status': 'FAKE'}}
+
+
+def api_error(status_code):
+    return gspread.exceptions.APIError(FakeResponse(status_code))
+
+
+class FakeHTTPClient:
+    """values_batch_get / fetch_sheet_metadata di atas grid string per worksheet"""
+
+    def __init__(self, client, latency=0.0):
+        self.client = client
+        self.latency = latency
+        self.calls = []
+        self.failures = []  # (jenis request, file id, status HTTP) untuk request berikutnya (FIFO)
+        self._lock = threading.Lock()
+
+    def fail_next(self, *status_codes, request=None, file_id=None):
+        """Request berikutnya (opsional hanya jenis 'batch' / 'metadata' atau satu file) gagal"""
+        self.failures.extend((request, file_id, status) for status in status_codes)
+
+    def _request(self, call):
+        with self._lock:
+            self.calls.append(call)
+            status = None
+            for i, (kind, file_id, code) in enumerate(self.failures):
+                if kind in (None, call[0]) and file_id in (None, call[1]):
+                    status = self.failures.pop(i)[2]
+                    break
+        time.sleep(self.latency)
+        if status is not None:
+            raise api_error(status)
+
+    def batch_calls(self, file_id=None):
+        return [c for c in self.calls if c[0] == 'batch' and (file_id is None or c[1] == file_id)]
+
+    def fetch_sheet_metadata(self, file_id, params=None):
+        self._request(('metadata', file_id))
+        sheets = self.client.books[file_id]['sheets']
+        return {'sheets': [{'properties': {'index': i, 'title': title}} for i, (title, _) in enumerate(sheets)]}
+
+    def values_batch_get(self, file_id, ranges, params=None):
+        self._request(('batch', file_id, tuple(ranges)))
+        grids = dict(self.client.books[file_id]['sheets'])
+        value_ranges = []
+        for a1 in ranges:
+            match = re.match(r"'((?:[^']|'')+)'(?:!(.+))?$", a1)
+            title = match.group(1).replace("''", "'") if match else None
+            if title not in grids:
+                raise api_error(400)
+            values = self._slice(grids[title], match.group(2))
+            value_ranges.append({'range': a1, 'values': values} if values else {'range': a1})
+        return {'valueRanges': value_ranges}
+
+    @staticmethod
+    def _slice(grid, a1_range):
+        if a1_range is None:
+            rows = grid
+        elif a1_range == '1:1':
+            rows = grid[:1]
+        else:
+            start = int(re.match(r'A(\d+):', a1_range).group(1))
+            rows = grid[start - 1:]
+        # Seperti API asli: sel kosong di ujung baris dipangkas
+        trimmed = []
+        for row in rows:
+            row = list(row)
+            while row and row[-1] == '':
+                row.pop()
+            trimmed.append(row)
+        return trimmed
+
+
+class FakeSpreadsheet:
+    def __init__(self, file_id):
+        self.id = file_id
+
+
+class FakeSheetsClient:
+    """books = {file_id: {'name', 'modified', 'sheets': [(title, grid), ...]}}"""
+
+    def __init__(self, books, latency=0.0):
+        self.books = books
+        self.http_client = FakeHTTPClient(self, latency)
+
+    def list_spreadsheet_files(self):
+        return [{'id': k, 'name': b['name'], 'modifiedTime': b['modified']} for k, b in self.books.items()]
+
+    def open(self, title):
+        for file_id, book in self.books.items():
+            if book['name'] == title:
+                return FakeSpreadsheet(file_id)
+        raise gspread.exceptions.SpreadsheetNotFound(title)
+
+    def touch(self, file_id, modified):
+        self.books[file_id]['modified'] = modified
+
+    def rename_sheet(self, file_id, index, title):
+        sheets = self.books[file_id]['sheets']
+        sheets[index] = (title, sheets[index][1])
+
+
+SALES_HEADER = ['Ordernumber', 'Orderdate', 'ItemSKU', 'ItemPrice', 'ItemOrdered']
+
+
+def make_books():
+    """Satu kamus (2 worksheet), export sales dan dua file stock"""
+    return {
+        'kamus-id': {'name': 'Offline Store Kamus', 'modified': 't1', 'sheets': [
+            ('Store', [['POS', 'Store'], ['AMB1', 'AEON Mall BSD'], ['BSB1', 'Botani Square Bogor']]),
+            ('SKU', [['SKU', 'SKU_Category'], ['111', 'Bag'], ['112', 'Shoe']]),
+        ]},
+        'export-id': {'name': 'export_sales', 'modified': 't1', 'sheets': [
+            ('Sheet1', [
+                SALES_HEADER,
+                ['AMB1001', '01/09/2026', '111', '10,000', '2'],
+                ['BSB1002', '02/09/2026', '112', '5.5', '1'],
+            ]),
+        ]},
+        'amb-id': {'name': 'source_amb', 'modified': 't1', 'sheets': [
+            ('Stock', [['Location Code', 'SKU', 'Total'], ['AMB1', '111', '10'], ['AMB1', '112', '']]),
+        ]},
+        'bsb-id': {'name': 'source_bsb', 'modified': 't1', 'sheets': [
+            ('Stock', [['Location Code', 'SKU', 'Total'], ['BSB1', '111', '1']]),
+        ]},
+    }
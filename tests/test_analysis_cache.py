@@ -0,0 +1,14 @@
+import engine
+
+
+def test_get_or_compute_reports_hit_and_miss_on_stage():
+    cache = engine.AnalysisCache(max_entries=2)
+    computed = []
+    
+    first, second = {}, {}
+    assert cache.get_or_compute(('full_analysis', 1), lambda: computed.append(1) or 'a', first) == 'a'
+    assert cache.get_or_compute(('full_analysis', 1), lambda: computed.append(2) or 'b', second) == 'a'
+    
+    assert computed == [1]
+    assert (first['cached'], second['cached']) == (False, True)
+    assert cache.counters.stats()['full_analysis']['misses'] == 1
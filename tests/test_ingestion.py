@@ -0,0 +1,25 @@
+import pandas as pd
+import engine
+
+
+def ingest_quantity(values):
+    df = pd.DataFrame({'Total': values}, dtype=str)
+    return engine.apply_ingestion_schema(df, {'Total': 'quantity'})['Total']
+
+
+def test_whole_quantities_become_int32():
+    total = ingest_quantity(['1', '1,200', '0'])
+    assert total.dtype == 'int32'
+    assert list(total) == [1, 1200, 0]
+
+
+def test_missing_quantities_become_float32():
+    total = ingest_quantity(['1', '', '3'])
+    assert total.dtype == 'float32'
+    assert total.isna().tolist() == [False, True, False]
+
+
+def test_fractional_quantities_are_not_truncated():
+    total = ingest_quantity(['1', '2.5', '3'])
+    assert total.dtype == 'float32'
+    assert list(total) == [1.0, 2.5, 3.0]
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import engine
+
+
+@pytest.fixture
+def analysis_df():
+    rng = np.random.default_rng(0)
+    n = 600
+    ams = rng.integers(0, 50, n).astype(float)
+    total = rng.integers(0, 200, n).astype(float)
+    df = pd.DataFrame({
+        'Store_Name': rng.choice(['AEON Mall BSD', 'Botani Square Bogor', 'Mall Ciputra'], n),
+        'Total': total,
+        'AMS': ams,
+        'Month_Cover': np.where(ams > 0, total / np.where(ams > 0, ams, 1), 0),
+        'Avg_Price': rng.random(n) * 100000,
+    })
+    df['Week_Cover'] = df['Month_Cover'] * 4.33
+    return df
+
+
+@pytest.mark.parametrize('target', [3, 6, 8, 12])
+def test_scenario_matches_inventory_control_at_active_target(analysis_df, target):
+    thresholds = engine.weekcover_thresholds(target, critical=2, reorder=4, buffer_margin=4)
+    control = engine.summarize_inventory_control(analysis_df, thresholds)
+    scenario = engine.simulate_weekcover_scenarios(analysis_df, [target], 2, 4, 4).set_index('Store_Name')
+    
+    assert list(scenario['Replenish_Qty']) == list(control['replenishment_qty_suggest'])
+    need_reorder = scenario["🚨 Critical"] + scenario["⚠️ Need Reorder"]
+    assert list(need_reorder) == list(control['need_replenishment'])
@@ -0,0 +1,262 @@
+import time
+
+import gspread
+import pytest
+
+import engine
+from fake_sheets import FakeSheetsClient, SALES_HEADER, make_books
+
+
+def no_rate_limit():
+    return engine.TokenBucket(rate_per_minute=600000, capacity=1000)
+
+
+def make_reader(gc, sleeps=None, **kwargs):
+    """Reader tanpa tunggu sungguhan: sleep dicatat, jitter = batas atas backoff"""
+    sleeps = sleeps if sleeps is not None else []
+    return engine.SheetsReader(
+        gc, rate_limiter=no_rate_limit(), sleep=sleeps.append, jitter=lambda low, high: high, **kwargs
+    )
+
+
+@pytest.fixture
+def gc():
+    return FakeSheetsClient(make_books())
+
+
+@pytest.fixture
+def store(tmp_path):
+    return engine.SnapshotStore(tmp_path / "snapshots")
+
+
+# --- RETRY / BACKOFF ---
+def test_call_retries_429_with_exponential_backoff(gc):
+    sleeps = []
+    reader = make_reader(gc, sleeps)
+    gc.http_client.fail_next(429, 503)
+    
+    values = reader.read_ranges('amb-id', ["'Stock'"], 'amb')
+    
+    assert values[0][1] == ['AMB1', '111', '10']
+    assert sleeps == [1.0, 2.0]
+    metrics = reader.stats()['amb']
+    assert metrics['requests'] == 3
+    assert metrics['retries'] == 2
+    assert metrics['throttled'] == 1
+    assert metrics['errors'] == 0
+    assert metrics['backoff_s'] == pytest.approx(3.0)
+
+
+def test_call_gives_up_after_max_retries(gc):
+    sleeps = []
+    reader = make_reader(gc, sleeps, max_retries=2, backoff_max=1.5)
+    gc.http_client.fail_next(429, 429, 429)
+    
+    with pytest.raises(gspread.exceptions.APIError):
+        reader.read_ranges('amb-id', ["'Stock'"], 'amb')
+    
+    assert sleeps == [1.0, 1.5]  # Dibatasi backoff_max
+    metrics = reader.stats()['amb']
+    assert (metrics['requests'], metrics['retries'], metrics['throttled'], metrics['errors']) == (3, 2, 3, 1)
+
+
+def test_call_does_not_retry_client_errors(gc):
+    sleeps = []
+    reader = make_reader(gc, sleeps)
+    gc.http_client.fail_next(403)
+    
+    with pytest.raises(gspread.exceptions.APIError):
+        reader.read_ranges('amb-id', ["'Stock'"], 'amb')
+    
+    assert sleeps == []
+    assert reader.stats()['amb']['errors'] == 1
+
+
+def test_token_bucket_waits_when_burst_is_used():
+    now = [0.0]
+    sleeps = []
+    
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+    
+    bucket = engine.TokenBucket(rate_per_minute=60, capacity=2, clock=lambda: now[0], sleep=sleep)
+    
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, pytest.approx(1.0)]
+    assert sleeps == [pytest.approx(1.0)]
+
+
+# --- BATCHGET PER SPREADSHEET ---
+def test_fetch_reads_each_spreadsheet_with_one_batch_get(gc, store):
+    reader = make_reader(gc)
+    source_files = engine.find_source_files(gc)
+    
+    frames, errors = engine.fetch_source_frames(gc, source_files, snapshot_store=store, notify=lambda *a: None, reader=reader)
+    
+    assert errors == {}
+    assert set(frames) == {'store_kamus', 'sku_kamus', 'export', 'amb', 'bsb'}
+    kamus_batches = gc.http_client.batch_calls('kamus-id')
+    assert len(kamus_batches) == 1
+    assert kamus_batches[0][2] == ("'Store'", "'SKU'")
+    assert list(frames['sku_kamus']['SKU']) == ['111', '112']
+    for file_id in ('export-id', 'amb-id', 'bsb-id'):
+        assert len(gc.http_client.batch_calls(file_id)) == 1
+    # Sel kosong di ujung baris dipangkas API; frame tetap punya semua kolom
+    assert list(frames['amb']['Total']) == ['10', '']
+    
+    # Judul worksheet di-cache: refresh berikutnya tanpa metadata call
+    calls_before = len(gc.http_client.calls)
+    gc.touch('amb-id', 't2')
+    engine.fetch_source_frames(gc, engine.find_source_files(gc), snapshot_store=store, notify=lambda *a: None, reader=reader)
+    assert gc.http_client.calls[calls_before:] == [('batch', 'amb-id', ("'Stock'",))]
+
+
+def test_fetch_errors_apply_to_every_source_in_the_file(gc, store):
+    reader = make_reader(gc)
+    gc.books['kamus-id']['sheets'] = gc.books['kamus-id']['sheets'][:1]  # Sheet SKU hilang
+    
+    frames, errors = engine.fetch_source_frames(
+        gc, engine.find_source_files(gc), snapshot_store=store, notify=lambda *a: None, reader=reader
+    )
+    
+    assert set(errors) == {'store_kamus', 'sku_kamus'}
+    assert 'amb' in frames
+
+
+# --- INCREMENTAL SYNC EXPORT ---
+def test_incremental_sync_appends_rows_after_matching_anchor(gc, store):
+    reader = make_reader(gc)
+    df, info = engine.sync_sales_export(reader, 'export-id', store, 't1')
+    assert info == {'mode': 'full', 'new_rows': 2, 'total_rows': 2}
+    
+    grid = gc.books['export-id']['sheets'][0][1]
+    grid.append(['MCD1003', '03/09/2026', '111', '7,500', '3'])
+    gc.touch('export-id', 't2')
+    calls_before = len(gc.http_client.calls)
+    
+    df, info = engine.sync_sales_export(reader, 'export-id', store, 't2')
+    
+    assert info == {'mode': 'incremental', 'new_rows': 1, 'total_rows': 3}
+    assert list(df['Ordernumber']) == ['AMB1001', 'BSB1002', 'MCD1003']
+    # Header + baris penanda + delta dalam satu batchGet
+    assert gc.http_client.calls[calls_before:] == [('batch', 'export-id', ("'Sheet1'!1:1", "'Sheet1'!A3:E"))]
+    assert store.entry('export')['last_row'] == ['MCD1003', '03/09/2026', '111', '7,500', '3']
+
+
+def test_incremental_sync_falls_back_to_full_when_anchor_changes(gc, store):
+    reader = make_reader(gc)
+    engine.sync_sales_export(reader, 'export-id', store, 't1')
+    
+    # Sheet di-sort ulang: baris terakhir yang tersimpan tidak lagi di posisi yang sama
+    grid = gc.books['export-id']['sheets'][0][1]
+    grid[1], grid[2] = grid[2], grid[1]
+    grid.append(['MCD1003', '03/09/2026', '111', '7,500', '3'])
+    gc.touch('export-id', 't2')
+    
+    df, info = engine.sync_sales_export(reader, 'export-id', store, 't2')
+    
+    assert info == {'mode': 'full', 'new_rows': 3, 'total_rows': 3}
+    assert list(df['Ordernumber']) == ['BSB1002', 'AMB1001', 'MCD1003']
+
+
+def test_incremental_sync_falls_back_to_full_when_header_changes(gc, store):
+    reader = make_reader(gc)
+    engine.sync_sales_export(reader, 'export-id', store, 't1')
+    gc.books['export-id']['sheets'][0][1][0] = SALES_HEADER[:-1] + ['Qty']
+    gc.touch('export-id', 't2')
+    
+    df, info = engine.sync_sales_export(reader, 'export-id', store, 't2')
+    
+    assert info['mode'] == 'full'
+    assert 'Qty' in df.columns
+
+
+# --- RENAME WORKSHEET ---
+def test_renamed_worksheet_refetches_titles(gc):
+    reader = make_reader(gc)
+    reader.read_worksheets('amb-id', [0], 'amb')
+    gc.rename_sheet('amb-id', 0, 'Stock Oktober')
+    
+    values = reader.read_worksheets('amb-id', [0], 'amb')
+    
+    assert values[0][1] == ['AMB1', '111', '10']
+    assert reader.worksheet_titles('amb-id') == ['Stock Oktober']
+    assert [c[0] for c in gc.http_client.calls] == ['metadata', 'batch', 'batch', 'metadata', 'batch']
+
+
+def test_incremental_sync_survives_worksheet_rename(gc, store):
+    reader = make_reader(gc)
+    engine.sync_sales_export(reader, 'export-id', store, 't1')
+    gc.rename_sheet('export-id', 0, 'Sales')
+    gc.books['export-id']['sheets'][0][1].append(['MCD1003', '03/09/2026', '111', '7,500', '3'])
+    
+    df, info = engine.sync_sales_export(reader, 'export-id', store, 't2')
+    
+    assert info == {'mode': 'incremental', 'new_rows': 1, 'total_rows': 3}
+
+
+def test_rename_is_retried_only_once(gc):
+    reader = make_reader(gc)
+    reader.worksheet_titles('amb-id')
+    gc.http_client.fail_next(400, 400, request='batch')
+    
+    with pytest.raises(gspread.exceptions.APIError):
+        reader.read_worksheets('amb-id', [0], 'amb')
+    assert [c[0] for c in gc.http_client.calls] == ['metadata', 'batch', 'metadata', 'batch']
+
+
+# --- FETCH PARALEL ---
+def test_fetch_sheets_concurrently_overlaps_requests():
+    def slow(value):
+        def fetch():
+            time.sleep(0.2)
+            return value
+        return fetch
+    
+    def broken():
+        raise RuntimeError("sheet tidak bisa dibaca")
+    
+    start = time.perf_counter()
+    results, errors, timings = engine.fetch_sheets_concurrently(
+        {'a': slow(1), 'b': slow(2), 'c': slow(3), 'd': broken}, max_workers=4
+    )
+    elapsed = time.perf_counter() - start
+    
+    assert results == {'a': 1, 'b': 2, 'c': 3}
+    assert isinstance(errors['d'], RuntimeError)
+    assert set(timings) == {'a', 'b', 'c', 'd'}
+    assert min(timings[name] for name in 'abc') >= 0.2
+    # Waktu total ~ fetch paling lambat, bukan jumlah semua fetch (0.6s)
+    assert elapsed < 0.45
+
+
+def test_cold_load_time_is_the_slowest_file_not_the_sum(store):
+    gc = FakeSheetsClient(make_books(), latency=0.1)
+    reader = make_reader(gc)
+    source_files = engine.find_source_files(gc)
+    
+    start = time.perf_counter()
+    frames, errors = engine.fetch_source_frames(
+        gc, source_files, max_workers=4, snapshot_store=store, notify=lambda *a: None, reader=reader
+    )
+    elapsed = time.perf_counter() - start
+    
+    assert errors == {}
+    # Per file: metadata + batchGet = 0.2s; 4 file berurutan butuh 0.8s
+    assert elapsed < 0.6
+
+
+def test_raw_sales_export_is_not_kept_in_frame_cache(gc, store):
+    reader = make_reader(gc)
+    frame_cache = engine.SourceFrameCache()
+    source_files = engine.find_source_files(gc)
+    
+    engine.fetch_source_frames(gc, source_files, snapshot_store=store, frame_cache=frame_cache, notify=lambda *a: None, reader=reader)
+    assert frame_cache.get('export', 'export-id', 't1') is None
+    assert frame_cache.get('amb', 'amb-id', 't1') is not None
+    
+    # Export yang tidak berubah dibaca ulang dari snapshot, tanpa request ke Sheets
+    calls_before = len(gc.http_client.calls)
+    frames, _ = engine.fetch_source_frames(gc, source_files, snapshot_store=store, frame_cache=frame_cache, notify=lambda *a: None, reader=reader)
+    assert gc.http_client.calls[calls_before:] == []
+    assert list(frames['export']['Ordernumber']) == ['AMB1001', 'BSB1002']
@@ -0,0 +1,97 @@
+import pytest
+
+import engine
+from fake_sheets import FakeSheetsClient, make_books
+from test_sheets_reader import make_reader
+
+
+@pytest.fixture
+def gc():
+    return FakeSheetsClient(make_books())
+
+
+@pytest.fixture
+def refresher(gc, tmp_path):
+    refresher = engine.SnapshotRefresher(
+        gc, snapshot_store=engine.SnapshotStore(tmp_path / "snapshots"), reader=make_reader(gc)
+    )
+    assert refresher.refresh()
+    return refresher
+
+
+def set_stock(gc, file_id, rows):
+    grid = gc.books[file_id]['sheets'][0][1]
+    grid[1:] = rows
+
+
+def test_unchanged_sources_are_not_rebuilt(gc, refresher):
+    calls_before = len(gc.http_client.calls)
+    assert not refresher.refresh()
+    assert gc.http_client.calls[calls_before:] == []
+
+
+def test_failed_fetch_keeps_previous_frame_and_reports_error(gc, refresher):
+    snapshot = refresher.snapshot
+    set_stock(gc, 'amb-id', [['AMB1', '111', '99']])
+    gc.touch('amb-id', 't2')
+    gc.http_client.fail_next(403, request='batch')
+    
+    assert not refresher.refresh()
+    
+    assert refresher.snapshot is snapshot
+    assert sorted(refresher.snapshot.stock['Store_Code'].unique()) == ['AMB', 'BSB']
+    assert refresher.last_error.startswith('amb:')
+    
+    # Retry berikutnya berhasil: snapshot diganti dan error dihapus
+    assert refresher.refresh()
+    stock = refresher.snapshot.stock
+    assert list(stock.loc[stock['Store_Code'] == 'AMB', 'Total']) == [99]
+    assert refresher.last_error is None
+
+
+def test_other_changes_are_applied_while_failed_file_keeps_old_data(gc, refresher):
+    set_stock(gc, 'amb-id', [['AMB1', '111', '99']])
+    set_stock(gc, 'bsb-id', [['BSB1', '111', '7']])
+    gc.touch('amb-id', 't2')
+    gc.touch('bsb-id', 't2')
+    gc.http_client.fail_next(403, request='batch', file_id='amb-id')
+    
+    assert refresher.refresh()
+    
+    stock = refresher.snapshot.stock
+    assert stock.loc[stock['Store_Code'] == 'AMB', 'Total'].tolist()[0] == 10
+    assert list(stock.loc[stock['Store_Code'] == 'BSB', 'Total']) == [7]
+    assert refresher.snapshot.missing_sources() == []
+    assert refresher.last_error.startswith('amb:')
+    # amb tetap di versi lama, jadi dicoba lagi di refresh berikutnya
+    assert {key: modified for key, _, modified in refresher.source_files}['amb'] == 't1'
+
+
+def test_persistent_failure_only_retries_the_failed_file(gc, refresher):
+    gc.touch('amb-id', 't2')
+    gc.http_client.fail_next(403, 403, 403, request='batch', file_id='amb-id')
+    rebuilds = refresher.counters.stats()['snapshot']['misses']
+    
+    for _ in range(3):
+        calls_before = len(gc.http_client.calls)
+        assert not refresher.refresh()
+        assert gc.http_client.calls[calls_before:] == [('batch', 'amb-id', ("'Stock'",))]
+    
+    assert refresher.counters.stats()['snapshot']['misses'] == rebuilds
+    assert refresher.last_error.startswith('amb:')
+
+
+def test_warm_up_runs_before_the_new_snapshot_is_served(gc, tmp_path):
+    warmed = []
+    refresher = engine.SnapshotRefresher(
+        gc, snapshot_store=engine.SnapshotStore(tmp_path / "snapshots"), reader=make_reader(gc),
+        warm_up=lambda snapshot: warmed.append((snapshot, refresher.snapshot)),
+    )
+    assert refresher.refresh()
+    gc.touch('bsb-id', 't2')
+    assert refresher.refresh()
+    
+    (first, served_during_first), (second, served_during_second) = warmed
+    assert served_during_first is None
+    assert served_during_second is first
+    assert refresher.snapshot is second